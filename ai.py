@@ -1,13 +1,30 @@
 import math
+import time
 import pymunk
 from pymunk import Vec2d
 import gameobjects
+import maps
+import pathfinding
 from collections import defaultdict, deque
 
 # NOTE: use only 'map0' during development!
 
 MIN_ANGLE_DIF = math.radians(3) # 3 degrees, a bit more than we can turn each tick
 
+WALKABLE = maps.GRASS | maps.WOOD     # Kinds of tiles the tank can drive through
+WALKABLE_WITH_METAL = WALKABLE | maps.METAL # Same, when the tank is allowed to push metal boxes
+
+PATH_CACHE_SIZE = 256 # Number of paths an ai remembers
+
+#-- Cost in ticks of driving into each kind of tile, used by the "weighted" pathfinder
+TILE_TICKS  = 30 # About the time needed to turn toward a tile and drive to it
+WOOD_TICKS  = TILE_TICKS + gameobjects.Box.HITS_TO_DESTROY * gameobjects.Tank.SHOOT_COOLDOWN
+METAL_TICKS = TILE_TICKS + 60 # Metal boxes are pushed out of the way, which is slower
+TILE_COSTS  = [pathfinding.INFINITY] * (maps.METAL + 1) # Indexed by the bit of the kind of tile
+TILE_COSTS[maps.GRASS] = TILE_TICKS
+TILE_COSTS[maps.WOOD]  = WOOD_TICKS
+TILE_COSTS[maps.METAL] = METAL_TICKS
+
 
 
 def angle_between_vectors(vec1, vec2):
@@ -24,10 +41,30 @@ def periodic_difference_of_angles(angle1, angle2):
 
 class Ai:
     """ A simple ai that finds the shortest path to the target using
-    a breadth first search. Also capable of shooting other tanks and or wooden
+    a breadth first search (or another pathfinder). Also capable of shooting other tanks and or wooden
     boxes. """
 
-    def __init__(self, tank, game_objects_list, tanks_list, space, currentmap):
+    def __init__(self, tank, game_objects_list, tanks_list, space, currentmap, flow_fields=None, pathfinder="bfs",
+                 raycasts=None, raycaster=None, visibility=None, planner=None, influence=None):
+        """ flow_fields is an optional pathfinding.FlowFields shared by the ai of a game,
+            if it is given the ai reads its next tile from it instead of searching.
+            Otherwise the ai searches its paths with pathfinder, one of the names in
+            pathfinding.PATHFINDERS ("bfs", "astar", "jps" or "hpa"), or "dstar" to
+            keep an incremental pathfinding.DStarLite that is repaired when boxes are
+            destroyed or pushed, or "weighted" to find the fastest path in ticks, where
+            wooden boxes cost the time to shoot them and metal boxes the time to push them
+            (see TILE_COSTS).
+            raycasts is an optional RaycastScheduler shared by the ai of a game, if it is
+            given the line of fire of the ai is checked by it once per tick.
+            raycaster is an optional raycast.Raycaster, if it is given the line of fire
+            is checked on the tiles of the map instead of in the physics engine.
+            visibility is the visibility.Visibility of the game, shared by all the ai,
+            that tells which tanks can see each other.
+            planner is an optional planner.Planner shared by the ai of a game, if it is
+            given the paths are searched by its workers, and the ai waits for them.
+            influence is the influence.InfluenceMaps of the game, the weighted pathfinder
+            adds the danger of the tiles to their cost.
+        """
         self.tank               = tank
         self.game_objects_list  = game_objects_list
         self.tanks_list         = tanks_list
@@ -37,6 +74,20 @@ class Ai:
         self.MAX_X = currentmap.width - 1
         self.MAX_Y = currentmap.height - 1
         self.path = deque()
+        self.path_cache = {} # Paths found by find_shortest_path for the current revision of the map (and danger)
+        self.path_cache_revision = None
+        self.flow_fields = flow_fields
+        self.pathfinder = pathfinder
+        self.incremental_planner = pathfinding.DStarLite(currentmap) if pathfinder == "dstar" else None
+        self.nodes_expanded = 0 # Number of nodes expanded by the last search
+        self.raycasts = raycasts
+        self.raycaster = raycaster
+        self.visibility = visibility
+        self.planner = planner
+        self.influence = influence
+        self.target_in_sight = False # Last result of the raycasts of the scheduler
+        self.may_plan = True # Set by the AiScheduler, the ai waits to plan its next move while it is False
+        self.waiting_to_plan = False
         self.move_cycle = self.move_cycle_gen()
         self.update_grid_pos()
         self.walk_metal = False
@@ -56,13 +107,25 @@ class Ai:
 
 
     def maybe_shoot(self):
-        """ Makes a raycast query in front of the tank. If another tank
-            or a wooden box is found, then we shoot.
+        """ Returns whether we should shoot: when another tank or a wooden box is
+            in front of the tank.
+        """
+        if self.raycasts is not None:
+            return self.target_in_sight
+        return self.line_of_fire()
+
+    def line_of_fire(self):
+        """ Makes a raycast query in front of the tank, and returns whether another
+            tank or a wooden box is found.
         """
         angle = self.tank.body.angle - math.pi/2
 
         start = Vec2d(self.tank.body.position[0] - 0.5*math.cos(angle), self.tank.body.position[1] - 0.5*math.sin(angle))
         end = Vec2d(self.tank.body.position[0] - self.MAX_X*math.cos(angle), self.tank.body.position[1] - self.MAX_Y*math.sin(angle))
+        if self.raycaster is not None:
+            hit = self.raycaster.cast(start, end, ignore=self.tank)
+            return hit is not None and (hit.kind == maps.WOOD or isinstance(hit.obj, gameobjects.Tank))
+
         box_or_tank = self.space.segment_query_first(start, end, 0, pymunk.ShapeFilter())
 
         if hasattr(box_or_tank, "shape"):
@@ -81,15 +144,20 @@ class Ai:
         A generator that iteratively goes through all the required steps
         to move to our goal.
         """
-        self.find_shortest_path()
         while True:
+            while not self.may_plan:
+                self.waiting_to_plan = True
+                yield
+            self.waiting_to_plan = False
             self.update_grid_pos()
-            path = self.find_shortest_path()
-            if not path:
+            while not self.path_ready():
+                yield
+                self.update_grid_pos()
+            next_coord = self.next_tile()
+            if next_coord is None:
                 self.walk_metal = True
                 yield
                 continue
-            next_coord = path.popleft()
             target_angle = angle_between_vectors(self.tank.body.position, next_coord + (0.5, 0.5))
             periodic_angle = periodic_difference_of_angles(self.tank.body.angle, target_angle)
 
@@ -118,28 +186,90 @@ class Ai:
             self.tank.stop_moving()
 
 
+    def next_tile(self):
+        """ Returns the next tile on the shortest path to the target, or None if
+            the target cannot be reached.
+        """
+        if self.flow_fields is not None:
+            return self.flow_fields.next_tile(self.grid_pos.int_tuple, self.get_target_tile().int_tuple,
+                                              self.walkable_mask())
+        path = self.find_shortest_path()
+        if not path:
+            return None
+        return path.popleft()
+
+    def path_ready(self):
+        """ Returns whether next_tile can answer right away. Otherwise the path is being
+            searched by the workers of the planner.
+        """
+        if self.planner is None or self.flow_fields is not None:
+            return True
+        key = self.path_cache_key()
+        if key in self.path_cache:
+            return True
+        result = self.planner.request(key[0], key[1], self.walkable_mask(), self.extra_costs())
+        if result is self.planner.PENDING:
+            return False
+        path, self.nodes_expanded = result
+        self.cache_path(key, path)
+        return True
+
     def find_shortest_path(self):
-        """ A simple Breadth First Search using integer coordinates as our nodes.
-            Edges are calculated as we go, using an external function.
+        """ Returns the shortest path to the target tile. The paths are cached until the
+            tank changes tile, the target moves, or a box is destroyed or moved
+            (which increases the revision of the map).
+        """
+        key = self.path_cache_key()
+        if key not in self.path_cache:
+            self.cache_path(key, self.search_shortest_path())
+        path = self.path_cache[key]
+        # The caller consumes the path, so give it a copy
+        return deque(path) if path is not None else None
+
+    def path_cache_key(self):
+        """ Returns the key of the current path in path_cache, after forgetting the paths
+            found on older revisions of the map, or of the danger of the tiles for the
+            weighted pathfinder (see extra_costs).
+        """
+        revision = (self.currentmap.revision, self.extra_costs_revision())
+        if self.path_cache_revision != revision:
+            self.path_cache.clear()
+            self.path_cache_revision = revision
+        return (self.get_tile_of_position(self.tank.body.position).int_tuple,
+                self.get_target_tile().int_tuple, self.walk_metal)
+
+    def cache_path(self, key, path):
+        if len(self.path_cache) >= PATH_CACHE_SIZE:
+            self.path_cache.clear()
+        self.path_cache[key] = path
+
+    def search_shortest_path(self):
+        """ Searches the shortest path to the target tile with the pathfinder of the ai,
+            and returns the coordinates of the tiles on the way (without the tile of the tank).
         """
-        shortest_path = []
-        start = self.tank.body.position
-        queue = deque([[start]])
-
-        visited_nodes = set()
-
-        while queue:
-            path = queue.popleft()
-            node = path[-1]
-            if node == self.get_target_tile():
-                path.popleft()
-                return path
-            for neighbor in self.get_tile_neighbors(node):
-                if neighbor.int_tuple not in visited_nodes:
-                    new_path = deque(path)
-                    new_path.append(neighbor)
-                    queue.append(new_path)
-                    visited_nodes.add(neighbor.int_tuple)
+        start = self.get_tile_of_position(self.tank.body.position).int_tuple
+        target = self.get_target_tile().int_tuple
+        if self.incremental_planner is not None:
+            path, self.nodes_expanded = self.incremental_planner.find_path(start, target, self.walkable_mask())
+        elif self.pathfinder == "weighted":
+            path, self.nodes_expanded = pathfinding.weighted_search(
+                self.currentmap, start, target, self.walkable_mask(), TILE_COSTS, self.extra_costs())
+        else:
+            path, self.nodes_expanded = pathfinding.PATHFINDERS[self.pathfinder](
+                self.currentmap, start, target, self.walkable_mask())
+        return path
+
+    def extra_costs(self):
+        """ Returns the cost layer added to the tiles by the weighted pathfinder, if any. """
+        if self.influence is None or self.pathfinder != "weighted":
+            return None
+        return self.influence.cost_layer(self.tank)
+
+    def extra_costs_revision(self):
+        """ Returns the revision of the cost layer, which changes when it is computed again. """
+        if self.influence is None or self.pathfinder != "weighted":
+            return None
+        return self.influence.revision()
 
     def get_target_tile(self):
         """ Returns position of the flag if we don't have it. If we do have the flag,
@@ -152,16 +282,21 @@ class Ai:
             x, y = self.flag.x, self.flag.y
         return Vec2d(int(x), int(y))
 
+    def visible_enemies(self):
+        """ Returns the other tanks that our tank can see, the closest first. """
+        if self.visibility is None:
+            return []
+        return self.visibility.visible_tanks(self.tank)
+
     def get_flag(self):
         """ This has to be called to get the flag, since we don't know
             where it is when the Ai object is initialized.
         """
         if self.flag == None:
-        # Find the flag in the game objects list
-            for obj in self.game_objects_list:
-                if isinstance(obj, gameobjects.Flag):
-                    self.flag = obj
-                    break
+            # The flag is in the flags view of the game objects (an entities.EntityRegistry)
+            flags = self.game_objects_list.flags
+            if flags:
+                self.flag = flags[0]
         return self.flag
 
     def get_tile_of_position(self, position_vector):
@@ -185,12 +320,83 @@ class Ai:
 
         return filter(self.filter_tile_neighbors, neighbors)
 
+    def walkable_mask(self):
+        """ Returns the kinds of tiles the tank can drive through: grass and wooden
+            boxes, and metal boxes once walk_metal is set. The weighted pathfinder
+            always considers metal boxes, they just cost more.
+        """
+        if self.walk_metal or self.pathfinder == "weighted":
+            return WALKABLE_WITH_METAL
+        return WALKABLE
+
     def filter_tile_neighbors (self, coord):
-        walkable = [0,2]
-        if self.walk_metal:
-            walkable.append(3)
-        if coord[0] <= self.MAX_X and coord[0] >= 0:
-            if coord[1] <= self.MAX_Y and coord[1] >= 0:
-                if self.currentmap.boxAt(coord[0], coord[1]) in walkable:
-                    return True
-        return False
+        return self.currentmap.is_walkable(coord[0], coord[1], self.walkable_mask())
+
+
+class RaycastScheduler:
+    """ Makes the line of fire raycasts of all the ai of a game in one pass, before they
+        decide. A tank that cannot shoot yet (shoot_tick below Tank.SHOOT_COOLDOWN) does
+        not need one, and a tank that has not moved or turned since its last raycast
+        reuses the result for up to MAX_AGE ticks, unless a box was destroyed or moved.
+        issued and skipped count the raycasts made and avoided.
+    """
+
+    MAX_AGE = 10 # Ticks a result is reused while the pose of the tank does not change
+
+    def __init__(self, current_map):
+        self.current_map = current_map
+        self.last_raycasts = {} # The pose of the tank, revision of the map and tick of the last raycast of each ai
+        self.ticks   = 0
+        self.issued  = 0
+        self.skipped = 0
+
+    def update(self, ai_list):
+        """ Updates the target_in_sight of the ai, called once per tick. """
+        for ai in ai_list:
+            tank = ai.tank
+            if tank.shoot_tick < gameobjects.Tank.SHOOT_COOLDOWN:
+                self.skipped += 1
+                continue
+            pose = (tank.body.position, tank.body.angle, self.current_map.revision)
+            last_raycast = self.last_raycasts.get(ai)
+            if last_raycast is not None and last_raycast[0] == pose and self.ticks - last_raycast[1] < self.MAX_AGE:
+                self.skipped += 1
+                continue
+            ai.target_in_sight = ai.line_of_fire()
+            self.last_raycasts[ai] = (pose, self.ticks)
+            self.issued += 1
+        self.ticks += 1
+
+
+class AiScheduler:
+    """ Runs the ai of a game every tick, within a time budget (in milliseconds, None for
+        no limit). Every ai steers every tick, but once the budget of the tick is spent,
+        the ai that need to plan their next move (find the next tile) wait for the next
+        tick, where they go first. The first ai always plans, so that the ai make progress
+        whatever the budget. time_used and last_time are the time (in seconds)
+        taken by each ai in total and in the last tick.
+    """
+
+    def __init__(self, budget=None):
+        self.budget    = budget / 1000 if budget is not None else None
+        self.time_used = defaultdict(float)
+        self.last_time = {}
+        self.tick_time = 0 # Time taken by all the ai in the last tick
+        self.deferred  = 0 # Number of times an ai had to wait to plan
+
+    def run(self, ai_list):
+        """ Makes every ai decide, called once per tick. """
+        start = time.perf_counter()
+        if self.budget is not None:
+            # The ai that waited go first, otherwise the order stays the same
+            ai_list = sorted(ai_list, key=lambda ai: not ai.waiting_to_plan)
+        for i, ai in enumerate(ai_list):
+            began = time.perf_counter()
+            ai.may_plan = self.budget is None or i == 0 or began - start < self.budget
+            ai.decide()
+            elapsed = time.perf_counter() - began
+            self.last_time[ai] = elapsed
+            self.time_used[ai] += elapsed
+            if ai.waiting_to_plan:
+                self.deferred += 1
+        self.tick_time = time.perf_counter() - start
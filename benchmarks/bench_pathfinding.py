@@ -0,0 +1,102 @@
+import pygame
+import os
+import sys
+import time
+from collections import deque
+
+#-- The ctf modules are in the parent directory and need a display to load their images
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["SDL_VIDEODRIVER"] = "dummy"
+pygame.display.init()
+pygame.display.set_mode()
+
+import pymunk
+import random
+import ai
+import entities
+import gameobjects
+import maps
+import media
+import pathfinding
+
+
+def legacy_find_shortest_path(self):
+    """ The previous Ai.find_shortest_path, which copies the path for every tile it enqueues. """
+    start = self.tank.body.position
+    queue = deque([[start]])
+
+    visited_nodes = set()
+
+    while queue:
+        path = queue.popleft()
+        node = path[-1]
+        if node == self.get_target_tile():
+            path.popleft()
+            return path
+        for neighbor in self.get_tile_neighbors(node):
+            if neighbor.int_tuple not in visited_nodes:
+                new_path = deque(path)
+                new_path.append(neighbor)
+                queue.append(new_path)
+                visited_nodes.add(neighbor.int_tuple)
+
+
+def create_ai(current_map):
+    """ Creates an ai for the first tank of the map, without the boxes (the search only uses the map). """
+    space = pymunk.Space()
+    x, y, orientation = current_map.start_positions[0]
+    tank = gameobjects.Tank(x, y, orientation, media.tanks[0], space)
+    flag = gameobjects.Flag(current_map.flag_position[0], current_map.flag_position[1])
+    return ai.Ai(tank, entities.EntityRegistry([flag]), tank, space, current_map)
+
+
+def measure(function, repeat):
+    """ Returns the result of the function and the average time of a call in milliseconds. """
+    start_time = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return result, (time.perf_counter() - start_time) * 1000 / repeat
+
+
+def compare(name, current_map, repeat, walk_metal=False):
+    bot = create_ai(current_map)
+    bot.walk_metal = walk_metal
+    legacy_path, legacy_time = measure(lambda: legacy_find_shortest_path(bot), repeat)
+    path, time_ms = measure(bot.search_shortest_path, repeat)
+    assert (legacy_path is None) == (path is None) and len(legacy_path or []) == len(path or [])
+    print("%-12s path %5s   legacy %9.3f ms   parents %9.3f ms   speedup %5.1fx"
+          % (name, len(path) if path else "-", legacy_time, time_ms, legacy_time / time_ms))
+
+
+def compare_pathfinders(name, current_map, searches):
+    """ Times the pathfinders of pathfinding.PATHFINDERS on the same random searches. """
+    rng = random.Random(0)
+    walkable = ai.WALKABLE_WITH_METAL
+    free_tiles = [(x, y) for y in range(current_map.height) for x in range(current_map.width)
+                  if current_map.is_walkable(x, y, walkable)]
+    pairs = [(rng.choice(free_tiles), rng.choice(free_tiles)) for _ in range(searches)]
+
+    line = "%-12s" % name
+    for pathfinder_name, pathfinder in pathfinding.PATHFINDERS.items():
+        # The first search of the hierarchical pathfinder builds its graph, which is shared by all the ai
+        pathfinder(current_map, pairs[0][0], pairs[0][1], walkable)
+        expanded = 0
+        start_time = time.perf_counter()
+        for start, target in pairs:
+            expanded += pathfinder(current_map, start, target, walkable)[1]
+        time_ms = (time.perf_counter() - start_time) * 1000 / searches
+        line += "   %s %8.0f nodes %8.3f ms" % (pathfinder_name, expanded / searches, time_ms)
+    print(line)
+
+
+if __name__ == "__main__":
+    print("Ai.find_shortest_path before and after using a parent array:")
+    compare("map1", maps.map1, 200)
+    compare("map1 metal", maps.map1, 200, walk_metal=True)
+    for size in (50, 100, 200, 400):
+        compare("%dx%d" % (size, size), maps.generate_map(size, size, seed=size), max(1, 2000 // size))
+
+    print("Nodes expanded and time per search of each pathfinder:")
+    compare_pathfinders("map1", maps.map1, 200)
+    for size in (50, 100, 200, 400):
+        compare_pathfinders("%dx%d" % (size, size), maps.generate_map(size, size, seed=size), max(5, 4000 // size))
@@ -1,131 +1,86 @@
 import pygame
 from pygame.locals import *
 from pygame.color import *
-import pymunk
-import sys
+import argparse
+import os
+import time
+import planner
+
+#-- Parse the command line
+def non_negative_float(text):
+    value = float(text)
+    if value < 0:
+        raise argparse.ArgumentTypeError("%s is negative" % text)
+    return value
+
+parser = argparse.ArgumentParser(description="Capture the flag")
+game_mode = parser.add_mutually_exclusive_group(required=True)
+game_mode.add_argument("--singleplayer", dest="mode", action="store_const", const="--singleplayer",
+                       help="one player against the ai")
+game_mode.add_argument("--hot-multiplayer", dest="mode", action="store_const", const="--hot-multiplayer",
+                       help="two players on the same keyboard against the ai")
+game_mode.add_argument("--ai-only", dest="mode", action="store_const", const="--ai-only",
+                       help="every tank is controlled by the ai")
+parser.add_argument("--headless", action="store_true",
+                    help="run the simulation as fast as possible, without display, sound or input")
+parser.add_argument("--max-ticks", type=int, default=None,
+                    help="stop the game after this many ticks if nobody has won")
+parser.add_argument("--pathfinder", default="flow", choices=["flow", "bfs", "astar", "jps", "hpa", "dstar", "weighted"],
+                    help="how the ai find their way (see pathfinding.py)")
+parser.add_argument("--grid-raycasts", action="store_true",
+                    help="the ai check their line of fire on the tiles of the map (see raycast.py)")
+parser.add_argument("--ai-budget", type=non_negative_float, default=None,
+                    help="milliseconds the ai may spend planning each tick, the others wait for the next tick")
+parser.add_argument("--async-planning", choices=["threads", "processes"], default=None,
+                    help="search the paths of the ai in a pool of workers (bfs, astar, jps or weighted)")
+parser.add_argument("--influence-interval", type=int, default=None,
+                    help="ticks between two updates of the danger of the tiles (weighted pathfinder)")
+args = parser.parse_args()
+if args.async_planning is not None and args.pathfinder not in planner.ASYNC_PATHFINDERS:
+    parser.error("--async-planning needs --pathfinder %s" % " or ".join(planner.ASYNC_PATHFINDERS))
+argument = args.mode
+headless = args.headless
 
 #----- Initialisation -----#
 
 #-- Initialise the display
-pygame.init()
+if headless:
+    # The images still need a display mode to be loaded, so use a dummy video driver,
+    # the mixer is left uninitialised so that sounds are silent.
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    pygame.display.init()
+else:
+    pygame.init()
 pygame.display.set_mode()
 
 #-- Initialise the clock
 clock = pygame.time.Clock()
 
-#-- Initialise the physics engine
-space = pymunk.Space()
-space.gravity = (0.0,  0.0)
-space.damping = 0.1 # Adds friction to the ground for all objects
-
 #-- Import from the ctf framework
-import ai
 import media
 import gameobjects
 import maps
-
-#-- Constants
-FRAMERATE = 60
+import render
+from game import Game, FRAMERATE, INFLUENCE_INTERVAL
 
 #-- Variables
-try:
-    argument = sys.argv[1]
-except:
-    raise IndexError("Missing 1 Argument (--singleplayer or --hot-multiplayer)")
-    sys.exit()
 fog_of_war = False
+FOG_RADIUS = 150 / media.TILE_SIZE # How far the players see, in tiles
+dirty_rendering = True # Only repaint the parts of the screen that changed (not used with fog of war)
 
 #   Define the current level
 current_map         = maps.map0
 
-#   List of all game objects
-game_objects_list   = []
-tanks_list          = []
-ai_list             = []
-starttime           = []
-
-# Load all sounds
-wood_break_sound = pygame.mixer.Sound(media.wood_break_sfx)
-other_box_break_sound = pygame.mixer.Sound(media.other_box_sfx)
-explosion_sound = pygame.mixer.Sound(media.explosion_sfx)
-wood_break_sound.set_volume(0.1)
-other_box_break_sound.set_volume(0.1)
-explosion_sound.set_volume(0.1)
+#   Create the match, the first tanks are controlled by the players
+human_players = {"--singleplayer": 1, "--hot-multiplayer": 2, "--ai-only": 0}[argument]
+influence_interval = args.influence_interval if args.influence_interval is not None else INFLUENCE_INTERVAL
+game = Game(current_map, human_players, args.pathfinder, args.grid_raycasts, args.ai_budget,
+            args.async_planning, influence_interval)
+tanks_list = game.tanks_list
 
 #-- Resize the screen to the size of the current level
 screen = pygame.display.set_mode(current_map.rect().size)
 
-def collision_bullet_box(arb, space, data):
-    '''
-    creates collision between bullets and create_boxes
-    '''
-    box = arb.shapes[0]
-    bullet = arb.shapes[1]
-
-    if box.parent.destructable:
-        box.parent.box_hp += 1
-        if bullet.parent in game_objects_list:
-            wood_break_sound.play()
-            game_objects_list.remove(bullet.parent)
-            space.remove(bullet, bullet.body)
-        if box.parent.box_hp == 2:
-            box.parent.box_hp = 0
-            game_objects_list.remove(box.parent)
-            space.remove(box, box.body)
-            explosion = gameobjects.Explosion(box.body.position[0], box.body.position[1], game_objects_list)
-    else:
-        if bullet.parent in game_objects_list:
-            other_box_break_sound.play()
-            game_objects_list.remove(bullet.parent)
-            space.remove(bullet, bullet.body)
-
-    return False
-
-handler = space.add_collision_handler(3, 1)
-handler.pre_solve = collision_bullet_box
-
-def collision_bullet_tank(arb, space, data):
-    '''
-    creates collision between bullets and tanks
-    '''
-    tank = arb.shapes[0]
-    bullet = arb.shapes[1]
-    if bullet.parent.tank == tank.parent:
-        return False
-
-    if tank.parent.spawn_protection <= 0:
-        tank.parent.tank_hp += 1
-        if tank.parent.tank_hp == 3:
-            explosion_sound.play()
-            tank.parent.tank_hp = 0
-            tank.parent.spawn_protection = 150
-            explosion = gameobjects.Explosion(tank.body.position[0], tank.body.position[1], game_objects_list)
-            tank.body.position = tank.parent.start_position
-
-    if bullet.parent in game_objects_list:
-        game_objects_list.remove(bullet.parent)
-        space.remove(bullet, bullet.body)
-
-    if tank.parent.flag == flag:
-        gameobjects.Tank.drop_flag(tank.parent, flag)
-
-    return False
-
-handler = space.add_collision_handler(2, 1)
-handler.pre_solve = collision_bullet_tank
-handler = space.add_collision_handler(1, 2)
-
-
-
-#set barriers
-static_body = space.static_body
-space.add(pymunk.Segment(static_body, (0,0), (current_map.width,0), 0.0))
-space.add(pymunk.Segment(static_body, (0,0), (0,current_map.height), 0.0))
-space.add(pymunk.Segment(static_body, (current_map.width,0), (current_map.width,current_map.height), 0.0))
-space.add(pymunk.Segment(static_body, (0,current_map.height), (current_map.width,current_map.height), 0.0))
-
-
-
 #-- Generate the background
 background = pygame.Surface(screen.get_size())
 
@@ -137,189 +92,159 @@ for x in range(0, current_map.width):
         # image at the coordinates given as the second argument
         background.blit(media.grass,  (x*media.TILE_SIZE, y*media.TILE_SIZE))
 
-
-#-- Create the boxes
-def create_boxes():
-    ''' creates box objects and makes them visible'''
-    for x in range(0, current_map.width):
-        for y in range(0,  current_map.height):
-            # Get the type of boxes
-            box_type  = current_map.boxAt(x, y)
-            # If the box type is not 0 (aka grass tile), create a box
-            if(box_type != 0):
-                # Create a "Box" using the box_type, aswell as the x,y coordinates,
-                # and the pymunk space
-                box = gameobjects.get_box_with_type(x, y, box_type, space)
-                game_objects_list.append(box)
-
-
-#-- Create the tanks/bases
-# Loop over the starting poistion
-def create_tanks_and_bases():
-    ''' creates tank/flag objects and makes them visible'''
-    for i in range(0, len(current_map.start_positions)):
-        # Get the starting position of the tank "i"
-        pos = current_map.start_positions[i]
-        #create bases
-        base = gameobjects.GameVisibleObject(pos[0], pos[1], media.bases[i])
-        # Create the tank, media.tanks contains the image representing the tank
-        tank = gameobjects.Tank(pos[0], pos[1], pos[2], media.tanks[i], space)
-        # Add the tank to the list of tanks
-        tanks_list.append(tank)
-        starttime.append(0)
-        game_objects_list.append(base)
-        game_objects_list.append(tank)
-        if argument == "--singleplayer" and i >= 1:
-            AI = ai.Ai(tank, game_objects_list, tanks_list[i], space, current_map)
-            ai_list.append(AI)
-        if argument == "--hot-multiplayer" and i >= 2:
-            AI = ai.Ai(tank, game_objects_list, tanks_list[i], space, current_map)
-            ai_list.append(AI)
-
-#-- Create the flag
-flag = gameobjects.Flag(current_map.flag_position[0], current_map.flag_position[1])
-game_objects_list.append(flag)
-
-bg_music = pygame.mixer.music.load("data/music.wav")
-pygame.mixer.music.play(-1)
-
-
+#   Objects that never move are drawn once into the background instead of every frame
+static_layer = render.StaticLayer(background)
+for obj in game.static_objects:
+    static_layer.add(obj)
+background = static_layer.surface
+
+if not headless:
+    bg_music = pygame.mixer.music.load("data/music.wav")
+    pygame.mixer.music.play(-1)
+
+
+
+#-- Renderer that only repaints the parts of the screen that changed
+renderer = render.DirtyRenderer(screen, background)
+
+def draw_full_screen():
+    ''' redraws the background, every object and the fog of war, then flips the whole display '''
+    # Display the background on the screen
+    screen.blit(background, (0, 0))
+
+    for obj in game.game_objects_list:
+        obj.update_screen(screen)
+
+    #Fog of War, the players see the tiles around their tank that are not hidden behind boxes
+    if fog_of_war:
+        colour = (0, 0, 0)
+        fog_screen = pygame.Surface(current_map.rect().size)
+        fog_screen.fill(colour)
+        for tank in tanks_list[:human_players]:
+            for x, y in game.raycaster.visible_tiles(tank.body.position, FOG_RADIUS):
+                pygame.draw.rect(fog_screen, (50, 50, 50),
+                                 (x*media.TILE_SIZE, y*media.TILE_SIZE, media.TILE_SIZE, media.TILE_SIZE))
+        fog_screen.set_colorkey((50, 50, 50))
+        screen.blit(fog_screen, (0, 0))
+
+    #   Redisplay the entire screen (see double buffer technique)
+    pygame.display.flip()
+
+def handle_events():
+    ''' handles the keyboard input of the players, returns False when the game should quit '''
+    for event in pygame.event.get():
+        # Check if we receive a QUIT event (for instance, if the user press the
+        # close button of the wiendow) or if the user press the escape key.
+        if event.type == QUIT or (event.type == KEYDOWN and event.key == K_ESCAPE):
+            return False
+
+        if argument == "--singleplayer":
+
+            if event.type == KEYDOWN:
+                if event.key == K_UP:
+                    tanks_list[0].accelerate()
+                if event.key == K_DOWN:
+                    tanks_list[0].decelerate()
+                if event.key == K_RIGHT:
+                    tanks_list[0].turn_right()
+                if event.key == K_LEFT:
+                    tanks_list[0].turn_left()
+            if event.type == KEYUP:
+                if (event.key == K_DOWN or event.key == K_UP):
+                    tanks_list[0].stop_moving()
+                if (event.key == K_RIGHT or event.key == K_LEFT):
+                    tanks_list[0].stop_turning()
+            if event.type == KEYDOWN:
+                if event.key == K_RETURN:
+                    tanks_list[0].shoot(game.space, tanks_list[0], game.game_objects_list)
+
+        if argument == "--hot-multiplayer":
+            #player one
+            if event.type == KEYDOWN:
+                if event.key == K_UP:
+                    tanks_list[0].accelerate()
+                if event.key == K_DOWN:
+                    tanks_list[0].decelerate()
+                if event.key == K_RIGHT:
+                    tanks_list[0].turn_right()
+                if event.key == K_LEFT:
+                    tanks_list[0].turn_left()
+            if event.type == KEYUP:
+                if (event.key == K_DOWN or event.key == K_UP):
+                    tanks_list[0].stop_moving()
+                if (event.key == K_RIGHT or event.key == K_LEFT):
+                    tanks_list[0].stop_turning()
+            if event.type == KEYDOWN:
+                if event.key == K_RETURN:
+                    tanks_list[0].shoot(game.space, tanks_list[0], game.game_objects_list)
+
+            #player two
+            if event.type == KEYDOWN:
+                if event.key == K_w:
+                    tanks_list[1].accelerate()
+                if event.key == K_s:
+                    tanks_list[1].decelerate()
+                if event.key == K_d:
+                    tanks_list[1].turn_right()
+                if event.key == K_a:
+                    tanks_list[1].turn_left()
+            if event.type == KEYUP:
+                if (event.key == K_s or event.key == K_w):
+                    tanks_list[1].stop_moving()
+                if (event.key == K_d or event.key == K_a):
+                    tanks_list[1].stop_turning()
+            if event.type == KEYDOWN:
+                if event.key == K_SPACE:
+                    tanks_list[1].shoot(game.space, tanks_list[1], game.game_objects_list)
+
+    return True
 
 # main loop
 def main_loop():
     #-- Control whether the game run
     running = True
-    skip_update = 0
+    start_time = time.perf_counter()
     while running:
         #-- Handle the events
-        for event in pygame.event.get():
-            # Check if we receive a QUIT event (for instance, if the user press the
-            # close button of the wiendow) or if the user press the escape key.
-            if event.type == QUIT or (event.type == KEYDOWN and event.key == K_ESCAPE):
-                running = False
-
-            if argument == "--singleplayer":
-
-                if event.type == KEYDOWN:
-                    if event.key == K_UP:
-                        tanks_list[0].accelerate()
-                    if event.key == K_DOWN:
-                        tanks_list[0].decelerate()
-                    if event.key == K_RIGHT:
-                        tanks_list[0].turn_right()
-                    if event.key == K_LEFT:
-                        tanks_list[0].turn_left()
-                if event.type == KEYUP:
-                    if (event.key == K_DOWN or event.key == K_UP):
-                        tanks_list[0].stop_moving()
-                    if (event.key == K_RIGHT or event.key == K_LEFT):
-                        tanks_list[0].stop_turning()
-                if event.type == KEYDOWN:
-                    if event.key == K_RETURN:
-                        tanks_list[0].shoot(space, tanks_list[0], game_objects_list)
-
-            if argument == "--hot-multiplayer":
-                #player one
-                if event.type == KEYDOWN:
-                    if event.key == K_UP:
-                        tanks_list[0].accelerate()
-                    if event.key == K_DOWN:
-                        tanks_list[0].decelerate()
-                    if event.key == K_RIGHT:
-                        tanks_list[0].turn_right()
-                    if event.key == K_LEFT:
-                        tanks_list[0].turn_left()
-                if event.type == KEYUP:
-                    if (event.key == K_DOWN or event.key == K_UP):
-                        tanks_list[0].stop_moving()
-                    if (event.key == K_RIGHT or event.key == K_LEFT):
-                        tanks_list[0].stop_turning()
-                if event.type == KEYDOWN:
-                    if event.key == K_RETURN:
-                        tanks_list[0].shoot(space,tanks_list[0], game_objects_list)
-
-                #player two
-                if event.type == KEYDOWN:
-                    if event.key == K_w:
-                        tanks_list[1].accelerate()
-                    if event.key == K_s:
-                        tanks_list[1].decelerate()
-                    if event.key == K_d:
-                        tanks_list[1].turn_right()
-                    if event.key == K_a:
-                        tanks_list[1].turn_left()
-                if event.type == KEYUP:
-                    if (event.key == K_s or event.key == K_w):
-                        tanks_list[1].stop_moving()
-                    if (event.key == K_d or event.key == K_a):
-                        tanks_list[1].stop_turning()
-                if event.type == KEYDOWN:
-                    if event.key == K_SPACE:
-                        tanks_list[1].shoot(space, tanks_list[1], game_objects_list)
-
-        #tank capture the flag
-        for i in range(len(tanks_list)):
-            tanks_list[i].try_grab_flag(flag)
-            if tanks_list[i].has_won():
-                running = False
-
-        #start the ai
-        for ai in ai_list:
-            ai.decide()
-
-        #-- Update physics
-        if skip_update == 0:
-            # Loop over all the game objects and update their speed in function of their
-            # acceleration.
-            for obj in game_objects_list:
-                obj.update()
-            skip_update = 2
-        else:
-            skip_update -= 1
-
-        #   Check collisions and update the objects position
-        space.step(1 / FRAMERATE)
+        if not headless:
+            running = handle_events()
 
-        #   Update object that depends on an other object position (for instance a flag)
-        for obj in game_objects_list:
-            obj.post_update()
+        #-- Advance the match by one tick
+        if game.step() is not None:
+            running = False
 
+        #   Static objects that were removed must also be removed from the background
+        for obj in game.removed_static_objects:
+            renderer.invalidate(static_layer.remove(obj))
+        game.removed_static_objects.clear()
 
-        #-- Update Display
+        if args.max_ticks is not None and game.ticks >= args.max_ticks:
+            running = False
 
-        # Display the background on the screen
-        screen.blit(background, (0, 0))
+        # Nothing is drawn and the framerate is not limited in headless mode
+        if headless:
+            continue
 
-
-        for obj in game_objects_list:
-            obj.update_screen(screen)
-
-
-        #Fog of War
-        if fog_of_war:
-            colour = (0, 0, 0)
-            fog_screen = pygame.Surface(current_map.rect().size)
-            fog_screen.fill(colour)
-            pygame.draw.circle(fog_screen, (50, 50, 50), tanks_list[0].body.position * \
-             current_map.rect().size[0] // current_map.width, 150)
-            #for second player
-            if argument == "--hot-multiplayer":
-                pygame.draw.circle(fog_screen, (50, 50, 50), tanks_list[1].body.position * \
-                    current_map.rect().size[1] // current_map.width, 150)
-            fog_screen.set_colorkey((50, 50, 50))
-            screen.blit(fog_screen, (0, 0))
-
-
-        # Update the display of the game objects on the screen
-
-
-        #   Redisplay the entire screen (see double buffer technique)
-        pygame.display.flip()
+        #-- Update Display
+        if dirty_rendering and not fog_of_war and not gameobjects.DEBUG:
+            renderer.draw(game.game_objects_list)
+        else:
+            draw_full_screen()
 
         #   Control the game framerate
         clock.tick(FRAMERATE)
 
-#call the defined functions
-create_boxes()
-create_tanks_and_bases()
+    if headless:
+        elapsed = time.perf_counter() - start_time
+        if game.winner is None:
+            print("No winner after %d ticks" % game.ticks)
+        else:
+            print("Tank %d won after %d ticks" % (game.winner, game.ticks))
+        print("%d ticks in %.2f s (%.0f ticks/s)" % (game.ticks, elapsed, game.ticks / elapsed))
+        pool = game.bullet_pool
+        print("%d bullets shot, %d allocated, %d in use (at most %d)" % (pool.acquired, pool.allocated, pool.in_use, pool.peak))
+        culled = ", ".join("%s %d" % item for item in sorted(game.culled_bullets.items()))
+        print("bullets culled: %s" % (culled or "none"))
+        print("objects: %s" % ", ".join("%s %d" % item for item in sorted(game.object_counts().items())))
+
 main_loop()
@@ -0,0 +1,76 @@
+import gameobjects
+
+
+class EntityRegistry:
+    """ The game objects of a match. It can be used like the list it replaces (append,
+        remove, in, len, iteration in the order the objects were added), but adding and
+        removing an object takes constant time, and the objects are also sorted by kind
+        into views (tanks, bullets, boxes, effects and flags) when they are added, so
+        the code that needs one kind of objects does not have to look at all of them.
+
+        Iterating over the registry or a view iterates over a copy, so objects can be
+        added and removed meanwhile (for instance an explosion removing itself).
+    """
+
+    #-- The view of each kind of object
+    VIEWS = (("tanks",   gameobjects.Tank),
+             ("bullets", gameobjects.Bullet),
+             ("boxes",   gameobjects.Box),
+             ("effects", gameobjects.Explosion),
+             ("flags",   gameobjects.Flag))
+
+    def __init__(self, objects=()):
+        self.objects = {} # Used as an ordered set, the values are the views of the objects
+        self.views   = {name: {} for name, _ in self.VIEWS}
+        for obj in objects:
+            self.append(obj)
+
+    def append(self, obj):
+        view = None
+        for name, kind in self.VIEWS:
+            if isinstance(obj, kind):
+                view = self.views[name]
+                view[obj] = None
+                break
+        self.objects[obj] = view
+
+    def remove(self, obj):
+        """ Removes obj, raises ValueError if it is not in the registry (like a list). """
+        if obj not in self.objects:
+            raise ValueError("%r is not in the registry" % obj)
+        view = self.objects.pop(obj)
+        if view is not None:
+            del view[obj]
+
+    def __contains__(self, obj):
+        return obj in self.objects
+
+    def __len__(self):
+        return len(self.objects)
+
+    def __iter__(self):
+        return iter(list(self.objects))
+
+    def view(self, name):
+        """ Returns a copy of the list of the objects of a view, in the order they were added. """
+        return list(self.views[name])
+
+    @property
+    def tanks(self):
+        return self.view("tanks")
+
+    @property
+    def bullets(self):
+        return self.view("bullets")
+
+    @property
+    def boxes(self):
+        return self.view("boxes")
+
+    @property
+    def effects(self):
+        return self.view("effects")
+
+    @property
+    def flags(self):
+        return self.view("flags")
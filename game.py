@@ -0,0 +1,346 @@
+import pymunk
+from collections import Counter
+
+# The ctf modules load images when they are imported, so the pygame display must
+# have been initialised (pygame.display.set_mode) before this module is imported.
+import ai
+import entities
+import media
+import gameobjects
+import influence
+import pathfinding
+import planner
+import raycast
+import visibility
+
+#-- Constants
+FRAMERATE = 60
+BULLETS_PER_TANK = 4 # Bullets allocated in the pool for each tank of the map
+INFLUENCE_INTERVAL = 10 # Ticks between two updates of the danger and control grids of the ai
+
+
+class Game:
+    """ A capture the flag match. It owns a map, the physics engine (pymunk space) and
+        all the game objects, so several matches can be played one after the other, or
+        side by side, in the same process. Display and input are handled by ctf.py.
+    """
+
+    def __init__(self, current_map, human_players=0, pathfinder="flow", grid_raycasts=False, ai_budget=None,
+                 async_planning=None, influence_interval=INFLUENCE_INTERVAL):
+        """ Takes as arguments the map to play on and the number of tanks controlled by
+            players (the first tanks of the map), the other tanks are controlled by the ai.
+            The ai find their way with shared flow fields ("flow"), or with one of the
+            searches in pathfinding.PATHFINDERS, or with incremental searches ("dstar"),
+            or with the search that prices the boxes in ticks ("weighted", see ai.TILE_COSTS).
+            With grid_raycasts the ai check their line of fire with raycast.Raycaster
+            instead of the physics engine. ai_budget limits the time (in milliseconds)
+            the ai spend planning each tick, see ai.AiScheduler. async_planning ("threads"
+            or "processes") searches the paths in a pool of workers, see planner.Planner.
+            influence_interval is the number of ticks between two updates of the danger
+            of the tiles, see influence.InfluenceMaps.
+        """
+        if async_planning is not None and pathfinder not in planner.ASYNC_PATHFINDERS:
+            raise ValueError("%s cannot run in the planning workers, use one of %s"
+                             % (pathfinder, ", ".join(planner.ASYNC_PATHFINDERS)))
+        self.blueprint      = current_map
+        self.human_players  = human_players
+        self.pathfinder     = pathfinder
+        self.grid_raycasts  = grid_raycasts
+        self.ai_budget      = ai_budget
+        self.async_planning = async_planning
+        self.influence_interval = influence_interval
+        self.planner        = None
+
+        # Load all sounds
+        self.wood_break_sound = media.create_sound(media.wood_break_sfx, 0.1)
+        self.other_box_break_sound = media.create_sound(media.other_box_sfx, 0.1)
+        self.explosion_sound = media.create_sound(media.explosion_sfx, 0.1)
+
+        self.reset()
+
+    def reset(self):
+        """ Starts the match over: creates a new physics engine and all the game objects. """
+        # The boxes of the map follow the boxes of the match, so work on a copy of the map
+        self.current_map = self.blueprint.copy()
+
+        #-- Initialise the physics engine
+        self.space = pymunk.Space()
+        self.space.gravity = (0.0,  0.0)
+        self.space.damping = 0.1 # Adds friction to the ground for all objects
+
+        #   List of all game objects
+        self.game_objects_list  = entities.EntityRegistry() # With views of the tanks, bullets, movable boxes...
+        self.static_objects     = [] # Objects that never move, they are not updated every tick
+        self.removed_static_objects = [] # Static objects removed since the display last looked
+        self.tanks_list         = []
+        self.ai_list            = []
+        self.flow_fields        = pathfinding.FlowFields(self.current_map) # Shared by all the ai
+        self.raycasts           = ai.RaycastScheduler(self.current_map)
+        self.raycaster          = raycast.Raycaster(self.current_map) # Also used for the fog of war
+        self.visibility         = visibility.Visibility(self.raycaster, self.tanks_list) # Shared by all the ai
+        self.influence          = influence.InfluenceMaps(self.current_map, self.tanks_list,
+                                                          self.influence_interval) # Shared by all the ai
+        self.ai_scheduler       = ai.AiScheduler(self.ai_budget)
+        if self.planner is not None:
+            self.planner.shutdown()
+        self.planner = None
+        if self.async_planning is not None:
+            self.planner = planner.Planner(self.current_map, self.pathfinder, ai.TILE_COSTS,
+                                           processes=self.async_planning == "processes")
+
+        self.effects = {} # Effects queued by the collision handlers, see queue_effect
+        self.culled_bullets = Counter() # Bullets removed by cull_bullets, by reason
+
+        self.ticks       = 0
+        self.skip_update = 0
+        self.winner      = None # Index of the tank that has won
+
+        self.create_collision_handlers()
+        self.create_barriers()
+        self.create_flag()
+        self.create_boxes()
+        self.create_tanks_and_bases()
+
+    def create_collision_handlers(self):
+        handler = self.space.add_collision_handler(3, 1)
+        handler.pre_solve = self.collision_bullet_box
+        handler = self.space.add_collision_handler(2, 1)
+        handler.pre_solve = self.collision_bullet_tank
+
+    def create_barriers(self):
+        ''' creates the walls around the map '''
+        width, height = self.current_map.width, self.current_map.height
+        static_body = self.space.static_body
+        for start, end in (((0,0), (width,0)), ((0,0), (0,height)), ((width,0), (width,height)), ((0,height), (width,height))):
+            barrier = pymunk.Segment(static_body, start, end, 0.0)
+            barrier.filter = gameobjects.BARRIER_FILTER
+            self.space.add(barrier)
+
+    def create_flag(self):
+        flag_position = self.current_map.flag_position
+        self.flag = gameobjects.Flag(flag_position[0], flag_position[1])
+        self.game_objects_list.append(self.flag)
+
+    def create_boxes(self):
+        ''' creates box objects, boxes that cannot move are kept in static_objects '''
+        for x in range(0, self.current_map.width):
+            for y in range(0,  self.current_map.height):
+                # Get the type of boxes
+                box_type  = self.current_map.boxAt(x, y)
+                # If the box type is not 0 (aka grass tile), create a box
+                if(box_type != 0):
+                    # Create a "Box" using the box_type, aswell as the x,y coordinates,
+                    # and the pymunk space
+                    box = gameobjects.get_box_with_type(x, y, box_type, self.space)
+                    if box.movable:
+                        self.game_objects_list.append(box)
+                    else:
+                        self.static_objects.append(box)
+
+    def create_tanks_and_bases(self):
+        ''' creates tank/base objects and the ai of the tanks that are not controlled by players '''
+        self.bullet_pool = gameobjects.BulletPool(self.space, BULLETS_PER_TANK * len(self.current_map.start_positions))
+        for i in range(0, len(self.current_map.start_positions)):
+            # Get the starting position of the tank "i"
+            pos = self.current_map.start_positions[i]
+            #create bases
+            base = gameobjects.GameVisibleObject(pos[0], pos[1], media.bases[i])
+            # Create the tank, media.tanks contains the image representing the tank
+            tank = gameobjects.Tank(pos[0], pos[1], pos[2], media.tanks[i], self.space)
+            tank.bullet_pool = self.bullet_pool
+            # Add the tank to the list of tanks
+            self.tanks_list.append(tank)
+            self.game_objects_list.append(base)
+            self.game_objects_list.append(tank)
+            if i >= self.human_players:
+                raycaster = self.raycaster if self.grid_raycasts else None
+                if self.pathfinder == "flow":
+                    AI = ai.Ai(tank, self.game_objects_list, self.tanks_list[i], self.space, self.current_map,
+                               flow_fields=self.flow_fields, raycasts=self.raycasts,
+                               raycaster=raycaster, visibility=self.visibility, planner=self.planner,
+                               influence=self.influence)
+                else:
+                    AI = ai.Ai(tank, self.game_objects_list, self.tanks_list[i], self.space, self.current_map,
+                               pathfinder=self.pathfinder, raycasts=self.raycasts,
+                               raycaster=raycaster, visibility=self.visibility, planner=self.planner,
+                               influence=self.influence)
+                self.ai_list.append(AI)
+
+    def remove_box(self, box):
+        ''' removes a box from the game '''
+        self.current_map.remove_box(*box.tile)
+        if box.movable:
+            self.game_objects_list.remove(box)
+            self.space.remove(box.shape, box.body)
+        else:
+            self.static_objects.remove(box)
+            self.removed_static_objects.append(box)
+            self.space.remove(box.shape)
+
+    def remove_bullet(self, bullet):
+        ''' removes a bullet from the game, it goes back to the pool '''
+        self.game_objects_list.remove(bullet)
+        self.bullet_pool.release(bullet)
+
+    def cull_bullets(self):
+        ''' removes the bullets that are too old, that left the map, or that travelled too far
+            (Bullet.MAX_DISTANCE) without hitting anything, for instance on a large map '''
+        width, height = self.current_map.width, self.current_map.height
+        for bullet in self.game_objects_list.bullets:
+            x, y = bullet.body.position
+            if bullet.age > gameobjects.Bullet.TTL:
+                reason = "ttl"
+            elif not (0 <= x <= width and 0 <= y <= height):
+                reason = "out of bounds"
+            elif bullet.distance > gameobjects.Bullet.MAX_DISTANCE:
+                reason = "distance"
+            else:
+                continue
+            self.remove_bullet(bullet)
+            self.culled_bullets[reason] += 1
+
+    def object_counts(self):
+        """ Returns the number of game objects of each class (static objects included),
+            and of bodies and shapes in the physics engine, to watch for leaks.
+        """
+        counts = Counter(type(obj).__name__ for obj in self.game_objects_list)
+        counts.update(type(obj).__name__ for obj in self.static_objects)
+        counts["pymunk.Body"] = len(self.space.bodies)
+        counts["pymunk.Shape"] = len(self.space.shapes)
+        return counts
+
+    #-- The collision handlers run during the physics step, they only change the state of the
+    #   objects, the objects are removed at the end of the step and the effects (sounds and
+    #   explosions) are applied after it.
+
+    def remove_after_step(self, space, obj, remove):
+        ''' removes obj with remove (remove_bullet or remove_box) at the end of the physics step,
+            returns False if it was already going to be removed '''
+        return space.add_post_step_callback(lambda space, obj: remove(obj), obj)
+
+    def queue_effect(self, key, effect, *args):
+        ''' calls effect(*args) after the physics step, once per key and tick '''
+        if key not in self.effects:
+            self.effects[key] = (effect, args)
+
+    def apply_effects(self):
+        effects, self.effects = self.effects, {}
+        for effect, args in effects.values():
+            effect(*args)
+
+    def explode(self, position):
+        gameobjects.Explosion(position[0], position[1], self.game_objects_list)
+
+    def collision_bullet_box(self, arb, space, data):
+        '''
+        creates collision between bullets and boxes
+        '''
+        box = arb.shapes[0]
+        bullet = arb.shapes[1]
+
+        if box.parent.destructable:
+            box.parent.box_hp += 1
+            if self.remove_after_step(space, bullet.parent, self.remove_bullet):
+                self.queue_effect(self.wood_break_sound, self.wood_break_sound.play)
+            if box.parent.box_hp == gameobjects.Box.HITS_TO_DESTROY:
+                box.parent.box_hp = 0
+                self.remove_after_step(space, box.parent, self.remove_box)
+                self.queue_effect(box.parent, self.explode, box.body.position)
+        else:
+            if self.remove_after_step(space, bullet.parent, self.remove_bullet):
+                self.queue_effect(self.other_box_break_sound, self.other_box_break_sound.play)
+
+        return False
+
+    def collision_bullet_tank(self, arb, space, data):
+        '''
+        creates collision between bullets and tanks
+        '''
+        tank = arb.shapes[0]
+        bullet = arb.shapes[1]
+        if bullet.parent.tank == tank.parent:
+            return False
+
+        if tank.parent.spawn_protection <= 0:
+            tank.parent.tank_hp += 1
+            if tank.parent.tank_hp == 3:
+                self.queue_effect(self.explosion_sound, self.explosion_sound.play)
+                tank.parent.tank_hp = 0
+                tank.parent.spawn_protection = 150
+                self.queue_effect(tank.parent, self.explode, tank.body.position)
+                tank.body.position = tank.parent.start_position
+
+        self.remove_after_step(space, bullet.parent, self.remove_bullet)
+
+        if tank.parent.flag == self.flag:
+            gameobjects.Tank.drop_flag(tank.parent, self.flag)
+
+        return False
+
+    def step(self, n=1):
+        """ Advances the match by n ticks, or until a tank has won.
+            Returns the index of the tank that has won, or None.
+        """
+        for _ in range(n):
+            if self.winner is not None:
+                break
+            self.tick()
+        return self.winner
+
+    def tick(self):
+        """ Advances the match by one tick. """
+        #   The paths searched by the workers during the last tick
+        if self.planner is not None:
+            self.planner.collect()
+
+        #tank capture the flag
+        for i in range(len(self.tanks_list)):
+            self.tanks_list[i].try_grab_flag(self.flag)
+            if self.tanks_list[i].has_won() and self.winner is None:
+                self.winner = i
+
+        #start the ai, their raycasts are made first in one pass
+        if self.grid_raycasts:
+            self.raycaster.update(self.game_objects_list.tanks + self.game_objects_list.bullets)
+        self.visibility.expire()
+        self.influence.expire()
+        self.raycasts.update(self.ai_list)
+        self.ai_scheduler.run(self.ai_list)
+
+        #-- Update physics
+        if self.skip_update == 0:
+            # Loop over all the game objects and update their speed in function of their
+            # acceleration.
+            for obj in self.game_objects_list:
+                obj.update()
+            self.skip_update = 2
+        else:
+            self.skip_update -= 1
+
+        #   Check collisions and update the objects position
+        self.space.step(1 / FRAMERATE)
+        self.apply_effects()
+
+        #   Update object that depends on an other object position (for instance a flag)
+        for obj in self.game_objects_list:
+            obj.post_update()
+        self.update_box_tiles()
+        self.cull_bullets()
+
+        self.ticks += 1
+
+    def update_box_tiles(self):
+        """ Moves the boxes that were pushed to another tile in the map, all at once so that
+            boxes pushing each other are moved in the right order. A box that could not
+            be moved in the map yet is moved on a later tick.
+        """
+        moving = {} # The boxes by the tile they are on in the map, with their new tile
+        for box in self.game_objects_list.boxes:
+            tile = box.current_tile(self.current_map)
+            if tile != box.tile:
+                moving[box.tile] = (box, tile)
+        if not moving:
+            return
+        moves = [(old_tile, tile, box.box_type) for old_tile, (box, tile) in moving.items()]
+        for old_tile, new_tile, _ in self.current_map.move_boxes(moves):
+            moving[old_tile][0].tile = new_tile
@@ -2,19 +2,86 @@ import media
 import pygame
 import pymunk
 import math
+from collections import OrderedDict
 
 DEBUG = False # Change this to set it in debug mode
 
-pick_flag_sound = pygame.mixer.Sound(media.pick_flag_sfx)
-tank_shoot_sound = pygame.mixer.Sound(media.tank_shoot_sfx)
-pick_flag_sound.set_volume(0.1)
-tank_shoot_sound.set_volume(0.1)
+pick_flag_sound = media.create_sound(media.pick_flag_sfx, 0.1)
+tank_shoot_sound = media.create_sound(media.tank_shoot_sfx, 0.1)
+
+#-- Collision categories of the shapes. Two shapes only collide if each one is in the mask
+#   of the other, the other pairs are skipped by pymunk before any collision test.
+TANK_CATEGORY    = 1 << 0
+BULLET_CATEGORY  = 1 << 1
+WOOD_CATEGORY    = 1 << 2
+METAL_CATEGORY   = 1 << 3
+ROCK_CATEGORY    = 1 << 4
+BARRIER_CATEGORY = 1 << 5
+ALL_CATEGORIES   = pymunk.ShapeFilter.ALL_MASKS
+
+#   Bullets do not hit each other, and leave through the barriers (they are culled outside the map)
+TANK_FILTER    = pymunk.ShapeFilter(categories=TANK_CATEGORY, mask=ALL_CATEGORIES)
+BULLET_FILTER  = pymunk.ShapeFilter(categories=BULLET_CATEGORY,
+                                    mask=ALL_CATEGORIES ^ (BULLET_CATEGORY | BARRIER_CATEGORY))
+WOOD_FILTER    = pymunk.ShapeFilter(categories=WOOD_CATEGORY, mask=ALL_CATEGORIES)
+METAL_FILTER   = pymunk.ShapeFilter(categories=METAL_CATEGORY, mask=ALL_CATEGORIES)
+ROCK_FILTER    = pymunk.ShapeFilter(categories=ROCK_CATEGORY, mask=ALL_CATEGORIES)
+BARRIER_FILTER = pymunk.ShapeFilter(categories=BARRIER_CATEGORY, mask=ALL_CATEGORIES ^ BULLET_CATEGORY)
+
 
 def physics_to_display(x):
     """ This function is used to convert coordinates in the physic engine into the display coordinates """
     return x * media.TILE_SIZE
 
 
+class RotationCache:
+    """ A bounded cache of rotated sprites, keyed by the sprite and its angle rounded
+        to ANGLE_STEP degrees. The least recently used entry is evicted when full.
+        The hits and misses counters can be read to tune the size and the step.
+    """
+
+    ANGLE_STEP = 1 # Rotation precision in degrees
+    MAX_SIZE = 1024
+
+    def __init__(self, max_size=MAX_SIZE, angle_step=ANGLE_STEP):
+        self.max_size   = max_size
+        self.angle_step = angle_step
+        self.entries    = OrderedDict()
+        self.hits       = 0
+        self.misses     = 0
+
+    def quantize(self, angle):
+        """ Rounds an angle (in degrees) to the cache precision, in the range [0, 360). """
+        return (round(angle / self.angle_step) * self.angle_step) % 360
+
+    def get(self, sprite, angle):
+        """ Returns the sprite rotated by angle (in degrees) and the offset between
+            its center and its top left corner.
+        """
+        key = (sprite, self.quantize(angle))
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry
+
+        self.misses += 1
+        rotated = pygame.transform.rotate(sprite, key[1])
+        entry = (rotated, pymunk.Vec2d(rotated.get_size()) / 2.)
+        self.entries[key] = entry
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        self.entries.clear()
+        self.hits   = 0
+        self.misses = 0
+
+
+rotation_cache = RotationCache()
+
+
 class GameObject:
     """ Mostly handles visual aspects (pygame) of an object.
         Subclasses need to implement two functions:
@@ -23,6 +90,9 @@ class GameObject:
 
     def __init__(self, sprite):
         self.sprite         = sprite
+        self.rotated_angle  = None # Angle, sprite and offset from the last call to update_screen
+        self.rotated_sprite = None
+        self.rotated_offset = None
 
 
     def update(self):
@@ -37,22 +107,33 @@ class GameObject:
         return
 
 
-    def update_screen(self, screen):
-        """ Updates the visual part of the game. Should NOT need to be changed
-            by a subclass."""
-        sprite = self.sprite
-
+    def screen_sprite(self):
+        """ Returns the sprite as it should be drawn on the screen (rotated using the
+            rotation of the object) and the rectangle of the screen it covers.
+        """
         p = self.screen_position() # Get the position of the object (pygame coordinates)
-        sprite = pygame.transform.rotate(sprite, self.screen_orientation()) # Rotate the sprite using the rotation of the object
+        angle = self.screen_orientation()
+
+        # Rotate the sprite using the rotation of the object, the rotated sprite is
+        # reused as long as the angle does not change, and shared through the
+        # rotation cache with the other objects using the same sprite.
+        if angle != self.rotated_angle:
+            self.rotated_sprite, self.rotated_offset = rotation_cache.get(self.sprite, angle)
+            self.rotated_angle = angle
 
         # The position of the screen correspond to the center of the object,
         # but the function screen.blit expect to receive the top left corner
         # as argument, so we need to adjust the position p with an offset
         # which is the vector between the center of the sprite and the top left
         # corner of the sprite
-        offset = pymunk.Vec2d(sprite.get_size()) / 2.
-        p = p - offset
-        screen.blit(sprite, p) # Copy the sprite on the screen
+        p = p - self.rotated_offset
+        return self.rotated_sprite, self.rotated_sprite.get_rect(topleft=tuple(p))
+
+    def update_screen(self, screen):
+        """ Updates the visual part of the game. Should NOT need to be changed
+            by a subclass."""
+        sprite, rect = self.screen_sprite()
+        screen.blit(sprite, rect) # Copy the sprite on the screen
 
 
 
@@ -69,6 +150,7 @@ class GamePhysicsObject(GameObject):
         """
 
         super().__init__(sprite)
+        self.movable = movable
 
         # Half dimensions of the object converted from screen coordinates to physic coordinates
         half_width          = 0.5 * self.sprite.get_width() / media.TILE_SIZE
@@ -100,8 +182,10 @@ class GamePhysicsObject(GameObject):
         #self.shape.friction = 0.5
         #self.shape.elasticity = 0.1
 
-        # Add the object to the physic engine
-        if(movable):
+        # Add the object to the physic engine (objects created without a space are added later)
+        if space is None:
+            pass
+        elif(movable):
             space.add(self.body, self.shape)
         else:
             space.add(self.shape)
@@ -140,6 +224,7 @@ class Tank(GamePhysicsObject):
     ACCELERATION = 0.4
     NORMAL_MAX_SPEED = 3.5
     FLAG_MAX_SPEED = NORMAL_MAX_SPEED * 0.5
+    SHOOT_COOLDOWN = 60 # Number of ticks between two shots
 
     def __init__(self, x, y, orientation, sprite, space):
         super().__init__(x, y, orientation, sprite, space, True)
@@ -148,12 +233,14 @@ class Tank(GamePhysicsObject):
         self.rotation = 0 # 1 clockwise, 0 for no rotation, -1 counter clockwise
         self.shape.parent = self
         self.shape.collision_type = 2
+        self.shape.filter = TANK_FILTER
         self.spawn_protection = 150
         self.tank_hp = 0
         self.flag                 = None                      # This variable is used to access the flag object, if the current tank is carrying the flag
         self.max_speed        = Tank.NORMAL_MAX_SPEED     # Impose a maximum speed to the tank
         self.start_position       = pymunk.Vec2d(x, y)        # Define the start position, which is also the position where the tank has to return with the flag
-        self.shoot_tick = 60
+        self.shoot_tick = Tank.SHOOT_COOLDOWN
+        self.bullet_pool = None # If set, the bullets are taken from this BulletPool
         self.time_since_last_shot = pygame.time.get_ticks()
 
 
@@ -251,16 +338,22 @@ class Tank(GamePhysicsObject):
     def shoot(self, space, tank, game_objects_list):
         """ Call this function to shoot a missile (current implementation does nothing ! you need to implement it yourself) """
         self.tank = tank
-        if tank.shoot_tick >= 60:
+        if tank.shoot_tick >= Tank.SHOOT_COOLDOWN:
             tank_shoot_sound.play()
             self.shoot_tick = 0
-            game_objects_list.append(Bullet(self.body.position[0] - 0.5*math.sin(self.body.angle),\
-                self.body.position[1] + 0.5*math.cos(self.body.angle), math.degrees(self.body.angle), media.bullet, space, tank))
+            x = self.body.position[0] - 0.5*math.sin(self.body.angle)
+            y = self.body.position[1] + 0.5*math.cos(self.body.angle)
+            if self.bullet_pool is not None:
+                game_objects_list.append(self.bullet_pool.acquire(x, y, math.degrees(self.body.angle), tank))
+            else:
+                game_objects_list.append(Bullet(x, y, math.degrees(self.body.angle), media.bullet, space, tank))
 
 
 class Box(GamePhysicsObject):
     """ This class extends the GamePhysicsObject to handle box objects. """
 
+    HITS_TO_DESTROY = 2 # Number of bullets needed to destroy a destructable box
+
     def __init__(self, x, y, sprite, movable, space, destructable):
         """ It takes as arguments the coordinate of the starting position of the box (x,y) and the box model (boxmodel). """
         super().__init__(x, y, 0, sprite, space, movable)
@@ -269,15 +362,27 @@ class Box(GamePhysicsObject):
         self.shape.parent = self
         self.shape.collision_type = 3
         self.box_hp = 0
+        self.box_type = None
+        self.tile = (int(x), int(y)) # The tile of the map the box is on
+
+    def current_tile(self, current_map):
+        """ Returns the tile of current_map the center of the box is on. """
+        x, y = self.body.position
+        return (min(max(int(x), 0), current_map.width - 1), min(max(int(y), 0), current_map.height - 1))
 
 def get_box_with_type(x, y, type, space):
     (x, y) = (x + 0.5, y + 0.5) # Offsets the coordinate to the center of the tile
     if type == 1: # Creates a non-movable non-destructable rockbox
-        return Box(x, y, media.rockbox, False, space, False)
+        box = Box(x, y, media.rockbox, False, space, False)
+        box.shape.filter = ROCK_FILTER
     if type == 2: # Creates a movable destructable woodbox
-        return Box(x, y, media.woodbox, True, space, True)
+        box = Box(x, y, media.woodbox, True, space, True)
+        box.shape.filter = WOOD_FILTER
     if type == 3: # Creates a movable non-destructable metalbox
-        return Box(x, y, media.metalbox, True, space, False)
+        box = Box(x, y, media.metalbox, True, space, False)
+        box.shape.filter = METAL_FILTER
+    box.box_type = type
+    return box
 
 
 
@@ -324,13 +429,21 @@ class Bullet(GamePhysicsObject):
     '''
     extends from GamePhysicsObject and handles aspects of a bullet
     '''
+
+    TTL          = 10 * 60 # Number of ticks after which a bullet that has not hit anything is removed
+    MAX_DISTANCE = 30      # Distance (in tiles) after which a bullet that has not hit anything is removed
+
     def __init__(self, x, y, orientation, sprite, space, tank):
         super().__init__(x, y, orientation, sprite, space, True)
         self.acceleration = 1 # 1 forward, 0 for stand still, -1 for backwards
         self.VELOCITY = 5
         self.shape.parent = self
         self.shape.collision_type = 1
+        self.shape.filter = BULLET_FILTER
         self.tank = tank
+        self.age = 0 # Ticks since the bullet was shot
+        self.distance = 0 # Distance travelled since the bullet was shot
+        self.last_position = pymunk.Vec2d(x, y)
 
     def update(self):
         """ A function to update the objects coordinates. Gets called at every tick of the game. """
@@ -347,3 +460,59 @@ class Bullet(GamePhysicsObject):
 
         # Updates the rotation
         self.body.angular_velocity = 0
+
+    def post_update(self):
+        self.age += 1
+        position = self.body.position
+        self.distance += position.get_distance(self.last_position)
+        self.last_position = position
+
+
+class BulletPool:
+    """ Bullets that are reused instead of creating a new body and shape for every shot.
+        The bullets that are not flying are kept out of the physics engine. The pool
+        grows when all its bullets are in use. allocated is the number of bullets
+        created, acquired the number of shots, in_use and peak the number of bullets
+        flying now and at most.
+    """
+
+    def __init__(self, space, size):
+        """ Creates size bullets for the given space (for instance a few per tank). """
+        self.space     = space
+        self.free      = [Bullet(0, 0, 0, media.bullet, None, None) for _ in range(size)]
+        self.allocated = size
+        self.acquired  = 0
+        self.in_use    = 0
+        self.peak      = 0
+
+    def acquire(self, x, y, orientation, tank):
+        """ Returns a bullet shot by tank, at the given position and orientation (in degrees). """
+        if self.free:
+            bullet = self.free.pop()
+        else:
+            bullet = Bullet(0, 0, 0, media.bullet, None, None)
+            self.allocated += 1
+        bullet.body.position         = x, y
+        bullet.body.angle            = math.radians(orientation)
+        bullet.body.velocity         = pymunk.Vec2d.zero()
+        bullet.body.angular_velocity = 0
+        bullet.tank   = tank
+        bullet.age           = 0
+        bullet.distance      = 0
+        bullet.last_position = pymunk.Vec2d(x, y)
+        self.space.add(bullet.body, bullet.shape)
+        self.acquired += 1
+        self.in_use   += 1
+        self.peak      = max(self.peak, self.in_use)
+        return bullet
+
+    def release(self, bullet):
+        """ Takes a bullet out of the physics engine, to be reused. """
+        self.space.remove(bullet.shape, bullet.body)
+        bullet.tank = None
+        self.free.append(bullet)
+        self.in_use -= 1
+
+    def occupancy(self):
+        """ Returns the fraction of the bullets of the pool that are flying. """
+        return self.in_use / self.allocated if self.allocated else 0
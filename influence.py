@@ -0,0 +1,136 @@
+import numpy
+
+
+class InfluenceMaps:
+    """ Danger and control grids over the tiles of a map, for each tank (every tank is
+        its own team), computed for all the tanks and tiles at once with NumPy.
+
+        danger(tank) is how exposed each tile is to the fire of the other tanks: tiles in
+        a beam in front of an enemy tank, stronger the closer they are to it.
+        control(tank) is the presence of the tank on each tile minus the presence of the
+        other tanks, which fades with the distance.
+        cost_layer(tank) is the danger in ticks, as an extra cost for
+        pathfinding.weighted_search.
+
+        The game calls expire every tick, the grids are computed again when they are read
+        after that, at most every interval ticks. Boxes do not block the fire here.
+        Only the sum of the influence of all the tanks is kept as a grid, the grids of a
+        tank are computed from it when they are read, by removing its own influence.
+    """
+
+    RANGE        = 8    # Distance (in tiles) over which the influence of a tank fades
+    BEAM_WIDTH   = 0.75 # Distance from the line of fire of a tank under which a tile is in danger
+    DANGER_TICKS = 60   # Cost (in ticks) of the most dangerous tile
+
+    def __init__(self, current_map, tanks_list, interval=1):
+        self.current_map  = current_map
+        self.tanks_list   = tanks_list
+        self.interval     = interval
+        # Offsets of the tiles around a tank that it can influence
+        self.window_x, self.window_y = numpy.meshgrid(numpy.arange(-self.RANGE, self.RANGE + 1),
+                                                      numpy.arange(-self.RANGE, self.RANGE + 1))
+        self.ticks          = 0
+        self.updated_tick   = None
+        self.index          = {}
+        self.windows        = []   # Tiles (indexes of current_map.tiles) in the window of each tank, with its fire and presence
+        self.total_fire     = None # Flat arrays indexed like current_map.tiles
+        self.total_presence = None
+        self.dangers        = {}   # The grids of the tanks computed since the last update
+        self.controls       = {}
+        self.cost_layers    = {}
+        self.buffers        = {}   # The arrays of the cost layers, reused by every update
+
+    def expire(self):
+        """ The tanks have moved, called once per tick. """
+        self.ticks += 1
+
+    def revision(self):
+        """ Returns the tick at which the grids were computed, it changes every time they
+            are computed again (so it tells how long a path searched on them is valid).
+        """
+        self.update()
+        return self.updated_tick
+
+    def update(self):
+        """ Computes the grids, if they are more than interval ticks old. """
+        if self.updated_tick is not None and self.ticks - self.updated_tick < self.interval:
+            return
+        self.updated_tick = self.ticks
+        self.index = {tank: i for i, tank in enumerate(self.tanks_list)}
+        self.dangers, self.controls, self.cost_layers = {}, {}, {}
+
+        positions = numpy.array([tuple(tank.body.position) for tank in self.tanks_list], dtype=float).reshape(-1, 2)
+        angles = numpy.array([tank.body.angle for tank in self.tanks_list], dtype=float)
+        # The direction the tanks shoot in (see Tank.shoot)
+        heading_x = -numpy.sin(angles)[:, numpy.newaxis, numpy.newaxis]
+        heading_y = numpy.cos(angles)[:, numpy.newaxis, numpy.newaxis]
+
+        # Only the tiles in a window around each tank are computed, arrays of tanks x window
+        tile_x = numpy.floor(positions[:, 0, numpy.newaxis, numpy.newaxis]) + self.window_x
+        tile_y = numpy.floor(positions[:, 1, numpy.newaxis, numpy.newaxis]) + self.window_y
+        dx = tile_x + 0.5 - positions[:, 0, numpy.newaxis, numpy.newaxis]
+        dy = tile_y + 0.5 - positions[:, 1, numpy.newaxis, numpy.newaxis]
+        along = dx * heading_x + dy * heading_y
+        across = numpy.abs(dx * heading_y - dy * heading_x)
+        fading = numpy.maximum(1 - along / self.RANGE, 0)
+        fire = numpy.where((along > 0) & (across < self.BEAM_WIDTH), fading, 0)
+        presence = numpy.maximum(1 - numpy.hypot(dx, dy) / self.RANGE, 0)
+
+        # Keep the tiles of the windows that are in the map, in the order of the tanks
+        inside = (tile_x >= 0) & (tile_x < self.current_map.width) & (tile_y >= 0) & (tile_y < self.current_map.height)
+        tank = numpy.broadcast_to(numpy.arange(len(positions))[:, numpy.newaxis, numpy.newaxis], inside.shape)[inside]
+        nodes = (tile_y[inside].astype(int) + 1) * self.current_map.stride + tile_x[inside].astype(int) + 1
+        fire, presence = fire[inside], presence[inside]
+
+        # Add the windows of all the tanks into one grid
+        size = len(self.current_map.tiles)
+        self.total_fire = numpy.bincount(nodes, weights=fire, minlength=size)
+        self.total_presence = numpy.bincount(nodes, weights=presence, minlength=size)
+        bounds = numpy.searchsorted(tank, numpy.arange(len(positions) + 1)).tolist()
+        self.windows = [(nodes[first:last], fire[first:last], presence[first:last])
+                        for first, last in zip(bounds, bounds[1:])]
+
+    def grid(self, layer):
+        """ Returns the tiles of the map in a flat layer indexed like current_map.tiles, as an
+            array of height x width (a view of the layer, without its border).
+        """
+        return layer.reshape(self.current_map.height + 2, self.current_map.stride)[1:-1, 1:-1]
+
+    def danger_layer(self, tank):
+        """ Returns the danger of the tiles for tank, indexed like current_map.tiles. """
+        self.update()
+        if tank not in self.dangers:
+            nodes, fire, _ = self.windows[self.index[tank]]
+            layer = self.total_fire.copy()
+            layer[nodes] -= fire
+            self.dangers[tank] = layer
+        return self.dangers[tank]
+
+    def danger(self, tank):
+        return self.grid(self.danger_layer(tank))
+
+    def control(self, tank):
+        self.update()
+        if tank not in self.controls:
+            nodes, _, presence = self.windows[self.index[tank]]
+            layer = -self.total_presence
+            layer[nodes] += 2 * presence
+            self.controls[tank] = layer
+        return self.grid(self.controls[tank])
+
+    def cost_layer(self, tank):
+        """ Returns the danger of the tiles for tank in ticks, as an array indexed like the
+            tiles of the map (with their border), see pathfinding.weighted_search.
+            The array of each tank is written over by the next updates (allocating a new
+            one every time takes longer than computing it), copy it to keep it.
+        """
+        self.update()
+        if tank not in self.cost_layers:
+            if tank not in self.buffers:
+                self.buffers[tank] = numpy.empty(len(self.total_fire))
+            layer = self.buffers[tank]
+            nodes, fire, _ = self.windows[self.index[tank]]
+            numpy.multiply(self.total_fire, self.DANGER_TICKS, out=layer)
+            layer[nodes] -= fire * self.DANGER_TICKS
+            self.cost_layers[tank] = layer
+        return self.cost_layers[tank]
@@ -1,10 +1,23 @@
 import media
 import pygame
+import random
+from collections import deque
+from itertools import islice
+
+# One bit per kind of tile, used in Map.tiles
+GRASS = 1
+ROCK  = 2
+WOOD  = 4
+METAL = 8
+
+TILE_BITS = (GRASS, ROCK, WOOD, METAL) # The bit of each box type (0 is grass)
 
 
 class Map:
   """ An instance of Map is a blueprint for how the game map will look. """
 
+  MAX_CHANGES = 1024 # Number of revisions whose changed tiles are kept, see changed_tiles
+
   def __init__(self,  width,  height,  boxes,  start_positions, flag_position):
     """ Takes as argument the size of the map (width, height), an array with the boxes type,
         the start position of tanks (start_positions) and the position of the flag (flag_position).
@@ -14,6 +27,25 @@ class Map:
     self.boxes              = boxes
     self.start_positions    = start_positions
     self.flag_position      = flag_position
+    self.revision           = 0 # Increased every time a box is destroyed or moved to another tile
+    # The tiles that changed at each of the last revisions, changes[-1] led to the current revision
+    self.changes            = deque(maxlen=self.MAX_CHANGES)
+
+    # The bit of the kind of every tile, in a flat array with a border of empty tiles
+    # (0, never walkable) around the map, so that the neighbors of a tile never need
+    # a bounds check. The neighbors of the tile at index i are at i + offset for the
+    # offsets in neighbor_offsets (down, up, right, left).
+    self.stride             = width + 2
+    self.tiles              = bytearray(self.stride * (height + 2))
+    self.neighbor_offsets   = (self.stride, -self.stride, 1, -1)
+    for y in range(height):
+      for x in range(width):
+        self.tiles[self.index(x, y)] = TILE_BITS[boxes[y][x]]
+
+  def copy(self):
+    """ Returns a copy of the map whose boxes can be changed without changing this map. """
+    return Map(self.width, self.height, [list(row) for row in self.boxes],
+               self.start_positions, self.flag_position)
 
   def rect(self):
     return pygame.Rect(0, 0, media.TILE_SIZE*self.width,  media.TILE_SIZE*self.height)
@@ -22,6 +54,82 @@ class Map:
     """ Return the type of the box at coordinates (x, y). """
     return self.boxes[y][x]
 
+  def index(self, x, y):
+    """ Returns the index of the tile at coordinates (x, y) in tiles. """
+    return (y + 1) * self.stride + x + 1
+
+  def coordinates(self, index):
+    """ Returns the coordinates (x, y) of the tile at an index of tiles. """
+    y, x = divmod(index, self.stride)
+    return x - 1, y - 1
+
+  def is_walkable(self, x, y, mask):
+    """ Returns whether the tile at coordinates (x, y) is inside the map and one of the
+        kinds of tiles in mask (for instance GRASS | WOOD).
+    """
+    return 0 <= x < self.width and 0 <= y < self.height and self.tiles[self.index(x, y)] & mask != 0
+
+  def set_box(self, x, y, box_type):
+    self.boxes[y][x] = box_type
+    self.tiles[self.index(x, y)] = TILE_BITS[box_type]
+
+  def remove_box(self, x, y):
+    """ Replaces the box at coordinates (x, y) by grass, when a box is destroyed. """
+    self.set_box(x, y, 0)
+    self.changes.append([(x, y)])
+    self.revision += 1
+
+  def move_boxes(self, moves):
+    """ Moves boxes that were pushed during a tick, moves is a list of (old tile, new tile,
+        box type). A box is only moved once its new tile is free, so when boxes push each
+        other in a chain the front box is moved first, whatever the order of the moves.
+        A box whose new tile is still taken (by a box that did not move) stays on its
+        old tile. Returns the moves that were made.
+    """
+    done, pending = [], list(moves)
+    while pending:
+      waiting = []
+      for old_tile, new_tile, box_type in pending:
+        (old_x, old_y), (new_x, new_y) = old_tile, new_tile
+        if self.boxes[new_y][new_x] == 0:
+          self.set_box(old_x, old_y, 0)
+          self.set_box(new_x, new_y, box_type)
+          done.append((old_tile, new_tile, box_type))
+        else:
+          waiting.append((old_tile, new_tile, box_type))
+      if len(waiting) == len(pending):
+        break # The others wait for a tile that will not be freed in this tick
+      pending = waiting
+    if done:
+      self.changes.append([tile for old_tile, new_tile, _ in done for tile in (old_tile, new_tile)])
+      self.revision += 1
+    return done
+
+  def changed_tiles(self, revision):
+    """ Returns the set of tiles (x, y) that changed since the given revision, or None if
+        the revision is too old for its changes to be kept (then everything computed
+        from the tiles at that revision must be computed again).
+    """
+    oldest = self.revision - len(self.changes) # The oldest revision whose changes are kept
+    if revision < oldest:
+      return None
+    return set(tile for tiles in islice(self.changes, revision - oldest, None) for tile in tiles)
+
+
+def generate_map(width, height, seed=None):
+  """ Creates a random map of the given size, for instance to test the ai on large maps.
+      The tanks start in the corners and the flag is in the middle, those tiles are kept
+      free of boxes. The same seed always gives the same map.
+  """
+  rng = random.Random(seed)
+  # Type of each tile: mostly grass, then rock, wood and metal boxes
+  boxes = [rng.choices([0, 1, 2, 3], weights=[70, 15, 10, 5], k=width) for y in range(height)]
+  start_positions = [[0.5, 0.5, 0], [width - 0.5, 0.5, 0], [0.5, height - 0.5, 180], [width - 0.5, height - 0.5, 180]]
+  flag_position = [width // 2 + 0.5, height // 2 + 0.5]
+  for x, y in [pos[:2] for pos in start_positions] + [flag_position]:
+    boxes[int(y)][int(x)] = 0
+  return Map(width, height, boxes, start_positions, flag_position)
+
 
 map0 = Map(9, 9,
                [ [0, 1, 0, 0, 0, 0, 0, 1, 0],
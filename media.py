@@ -17,6 +17,25 @@ def load_sound(file):
     file = os.path.join(main_dir, 'data', file)
     return file
 
+class SilentSound:
+    """ Replaces pygame.mixer.Sound when the mixer is not initialised (for instance in headless mode). """
+
+    def play(self, *args, **kwargs):
+        return None
+
+    def set_volume(self, value):
+        return None
+
+def create_sound(file, volume):
+    """ Creates a sound from a file returned by load_sound, with the given volume.
+        The sound is silent if the mixer is not initialised.
+    """
+    if not pygame.mixer.get_init():
+        return SilentSound()
+    sound = pygame.mixer.Sound(file)
+    sound.set_volume(volume)
+    return sound
+
 TILE_SIZE = 40 # Define the default size of tiles
 
 """SFX"""
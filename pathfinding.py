@@ -0,0 +1,708 @@
+import heapq
+import weakref
+from collections import OrderedDict, deque
+from pymunk import Vec2d
+
+UNREACHABLE = -1
+INFINITY    = float("inf")
+NOT_VISITED = -1
+START       = -2 # Parent of the start tile
+
+
+#-- Searches for a path between two tiles of a map.
+#   They take as arguments the map, the start and target tiles (x, y) and the kinds
+#   of tiles that can be driven through (a mask of maps.GRASS, maps.WOOD...). They
+#   return the tiles from the start (excluded) to the target as a deque of Vec2d,
+#   or None if there is no path, and the number of nodes they expanded.
+
+def breadth_first_search(current_map, start, target, walkable):
+    """ Explores the tiles in order of distance from the start. """
+    if start == target:
+        return path_back_to_target(current_map, target, walkable)
+    tiles = current_map.tiles
+    offsets = current_map.neighbor_offsets
+    start = current_map.index(*start)
+    target = current_map.index(*target)
+
+    parents = [NOT_VISITED] * len(tiles)
+    parents[start] = START
+    queue = deque([start])
+    expanded = 0
+
+    while queue:
+        node = queue.popleft()
+        if node == target:
+            return build_path(current_map, parents, node), expanded
+        expanded += 1
+        for offset in offsets:
+            neighbor = node + offset
+            if tiles[neighbor] & walkable and parents[neighbor] == NOT_VISITED:
+                parents[neighbor] = node
+                queue.append(neighbor)
+    return None, expanded
+
+
+def a_star(current_map, start, target, walkable):
+    """ Explores the tiles in order of distance from the start plus Manhattan distance
+        to the target, so that tiles leading away from the target are explored last.
+    """
+    if start == target:
+        return path_back_to_target(current_map, target, walkable)
+    tiles = current_map.tiles
+    offsets = current_map.neighbor_offsets
+    stride = current_map.stride
+    target_x, target_y = target
+    start = current_map.index(*start)
+    target = current_map.index(*target)
+
+    parents = [NOT_VISITED] * len(tiles)
+    parents[start] = START
+    costs = {start: 0}
+    # Ties are broken in favor of the tiles that are the furthest from the start
+    open_list = [(0, 0, start)]
+    expanded = 0
+
+    while open_list:
+        estimate, negative_cost, node = heapq.heappop(open_list)
+        cost = -negative_cost
+        if node == target:
+            return build_path(current_map, parents, node), expanded
+        if cost > costs[node]:
+            continue # An outdated entry, the tile was reached with a lower cost since
+        expanded += 1
+        for offset in offsets:
+            neighbor = node + offset
+            if tiles[neighbor] & walkable and cost + 1 < costs.get(neighbor, cost + 2):
+                costs[neighbor] = cost + 1
+                parents[neighbor] = node
+                y, x = divmod(neighbor, stride)
+                heuristic = abs(x - 1 - target_x) + abs(y - 1 - target_y)
+                heapq.heappush(open_list, (cost + 1 + heuristic, -(cost + 1), neighbor))
+    return None, expanded
+
+
+def jump_point_search(current_map, start, target, walkable):
+    """ A* that only expands jump points: it moves in straight lines and stops on the
+        tiles where the shortest paths may turn, which skips most of the open areas.
+
+        A path can always be rearranged so that it never turns from a horizontal move
+        to a vertical move, unless the tile it would cut through is blocked. So
+        horizontal jumps only stop before such a blocked corner, and vertical jumps
+        stop on the tiles from which a horizontal jump finds something.
+    """
+    if start == target:
+        return path_back_to_target(current_map, target, walkable)
+    tiles = current_map.tiles
+    stride = current_map.stride
+    target_x, target_y = target
+    start = current_map.index(*start)
+    target = current_map.index(*target)
+
+    def jump_horizontally(node, dx):
+        while True:
+            node += dx
+            if not tiles[node] & walkable:
+                return None
+            if node == target:
+                return node
+            for dy in (stride, -stride):
+                if tiles[node + dy] & walkable and not tiles[node - dx + dy] & walkable:
+                    return node
+
+    def jump_vertically(node, dy):
+        while True:
+            node += dy
+            if not tiles[node] & walkable:
+                return None
+            if node == target or jump_horizontally(node, 1) is not None \
+                    or jump_horizontally(node, -1) is not None:
+                return node
+
+    def directions(node, parent):
+        """ The directions to jump to from a jump point, given the jump point it was reached from. """
+        if parent == START:
+            return (1, -1, stride, -stride)
+        d = node - parent
+        if abs(d) >= stride:
+            return (stride if d > 0 else -stride, 1, -1)
+        dx = 1 if d > 0 else -1
+        return (dx,) + tuple(dy for dy in (stride, -stride)
+                             if tiles[node + dy] & walkable and not tiles[node - dx + dy] & walkable)
+
+    parents = {start: START}
+    costs = {start: 0}
+    open_list = [(0, 0, start)]
+    expanded = 0
+
+    while open_list:
+        estimate, negative_cost, node = heapq.heappop(open_list)
+        cost = -negative_cost
+        if node == target:
+            return build_jump_path(current_map, parents, node), expanded
+        if cost > costs[node]:
+            continue
+        expanded += 1
+        for direction in directions(node, parents[node]):
+            if abs(direction) == 1:
+                jump_point = jump_horizontally(node, direction)
+            else:
+                jump_point = jump_vertically(node, direction)
+            if jump_point is None:
+                continue
+            y, x = divmod(jump_point, stride)
+            new_cost = cost + abs(jump_point - node) // (stride if abs(direction) != 1 else 1)
+            if new_cost < costs.get(jump_point, new_cost + 1):
+                costs[jump_point] = new_cost
+                parents[jump_point] = node
+                heuristic = abs(x - 1 - target_x) + abs(y - 1 - target_y)
+                heapq.heappush(open_list, (new_cost + heuristic, -new_cost, jump_point))
+    return None, expanded
+
+
+def weighted_search(current_map, start, target, walkable, tile_costs, extra_costs=None):
+    """ A* where entering a tile costs tile_costs[kind of the tile] instead of 1, a
+        sequence indexed by the bits of maps.GRASS, maps.WOOD... (for instance the
+        number of ticks needed to drive through the tile). Finds the cheapest path.
+        extra_costs is an optional cost layer added to the cost of each tile, an array of
+        floats indexed like current_map.tiles (for instance the NumPy array of the danger
+        of the tiles, see influence.py).
+    """
+    if start == target:
+        return path_back_to_target(current_map, target, walkable)
+    tiles = current_map.tiles
+    offsets = current_map.neighbor_offsets
+    stride = current_map.stride
+    target_x, target_y = target
+    start = current_map.index(*start)
+    target = current_map.index(*target)
+    # The Manhattan distance times the cheapest kind of tile never overestimates the cost
+    min_cost = min(tile_costs[kind] for kind in range(1, len(tile_costs)) if kind & walkable)
+    if extra_costs is not None:
+        # The items of a memoryview are read as Python floats, faster than those of the array
+        extra_costs = memoryview(extra_costs)
+
+    parents = [NOT_VISITED] * len(tiles)
+    parents[start] = START
+    costs = {start: 0}
+    open_list = [(0, 0, start)]
+    expanded = 0
+
+    while open_list:
+        estimate, negative_cost, node = heapq.heappop(open_list)
+        cost = -negative_cost
+        if node == target:
+            return build_path(current_map, parents, node), expanded
+        if cost > costs[node]:
+            continue # An outdated entry, the tile was reached with a lower cost since
+        expanded += 1
+        for offset in offsets:
+            neighbor = node + offset
+            kind = tiles[neighbor]
+            if kind & walkable:
+                new_cost = cost + tile_costs[kind]
+                if extra_costs is not None:
+                    new_cost += extra_costs[neighbor]
+                if new_cost < costs.get(neighbor, INFINITY):
+                    costs[neighbor] = new_cost
+                    parents[neighbor] = node
+                    y, x = divmod(neighbor, stride)
+                    heuristic = min_cost * (abs(x - 1 - target_x) + abs(y - 1 - target_y))
+                    heapq.heappush(open_list, (new_cost + heuristic, -new_cost, neighbor))
+    return None, expanded
+
+
+def path_back_to_target(current_map, target, walkable):
+    """ The path of a tank that is already on the target tile: to its first walkable
+        neighbor and back, so that it drives to the center of the target.
+    """
+    node = current_map.index(*target)
+    for offset in current_map.neighbor_offsets:
+        if current_map.tiles[node + offset] & walkable:
+            return deque([Vec2d(current_map.coordinates(node + offset)), Vec2d(target)]), 1
+    return None, 1
+
+
+def build_path(current_map, parents, node):
+    """ Follows the parents from a tile back to the start, and returns the
+        coordinates of the tiles on the way (without the start).
+    """
+    path = deque()
+    while parents[node] != START:
+        path.appendleft(Vec2d(current_map.coordinates(node)))
+        node = parents[node]
+    return path
+
+
+def build_jump_path(current_map, parents, node):
+    """ Same as build_path, but the parents are jump points on the same row or column,
+        so the tiles between them are added too.
+    """
+    path = deque()
+    while parents[node] != START:
+        parent = parents[node]
+        step = current_map.stride if abs(node - parent) >= current_map.stride else 1
+        step = step if node > parent else -step
+        while node != parent:
+            path.appendleft(Vec2d(current_map.coordinates(node)))
+            node -= step
+    return path
+
+
+class FlowField:
+    """ The distance (in tiles) from every tile of a map to a target tile, computed with
+        a single breadth first search starting from the target. Any tank can then find
+        the next tile on its shortest path to the target by looking at its neighbors.
+    """
+
+    def __init__(self, current_map, target, walkable):
+        """ Takes as arguments the map, the target tile (x, y) and the kinds of tiles
+            the tanks can drive through (a mask of maps.GRASS, maps.WOOD...).
+        """
+        self.current_map = current_map
+        self.walkable    = walkable
+        self.distances   = [UNREACHABLE] * len(current_map.tiles) # Indexed like Map.tiles
+
+        tiles = current_map.tiles
+        offsets = current_map.neighbor_offsets
+        target = current_map.index(*target)
+        # A tile can only be reached if it can be driven through
+        if not tiles[target] & walkable:
+            return
+
+        self.distances[target] = 0
+        queue = deque([target])
+        while queue:
+            node = queue.popleft()
+            distance = self.distances[node] + 1
+            for offset in offsets:
+                neighbor = node + offset
+                if tiles[neighbor] & walkable and self.distances[neighbor] == UNREACHABLE:
+                    self.distances[neighbor] = distance
+                    queue.append(neighbor)
+
+    def next_tile(self, tile):
+        """ Returns the neighbor of tile (x, y) that is the closest to the target, or None
+            if the target cannot be reached. On the target itself, this is the closest
+            neighbor, from which the tank can come back to the center of the target.
+        """
+        node = self.current_map.index(*tile)
+        best, best_distance = None, UNREACHABLE
+        for offset in self.current_map.neighbor_offsets:
+            distance = self.distances[node + offset]
+            if distance != UNREACHABLE and (best is None or distance < best_distance):
+                best, best_distance = node + offset, distance
+        return Vec2d(self.current_map.coordinates(best)) if best is not None else None
+
+
+class FlowFields:
+    """ The flow fields toward the targets of the ai (the flag and the bases), shared by
+        all the ai of a game so that each target is only searched once. The fields are
+        kept until the revision of the map changes (a box was destroyed or moved).
+    """
+
+    MAX_SIZE = 64
+
+    def __init__(self, current_map):
+        self.current_map = current_map
+        self.revision    = current_map.revision
+        self.fields      = OrderedDict()
+
+    def get(self, target, walkable):
+        """ Returns the flow field toward the tile target (x, y) for the given mask of walkable tiles. """
+        if self.revision != self.current_map.revision:
+            self.fields.clear()
+            self.revision = self.current_map.revision
+
+        key = (target, walkable)
+        field = self.fields.get(key)
+        if field is None:
+            field = FlowField(self.current_map, target, walkable)
+            self.fields[key] = field
+            if len(self.fields) > self.MAX_SIZE:
+                self.fields.popitem(last=False)
+        else:
+            self.fields.move_to_end(key)
+        return field
+
+    def next_tile(self, tile, target, walkable):
+        """ Returns the next tile on the shortest path from tile to target, or None. """
+        return self.get(target, walkable).next_tile(tile)
+
+
+class HierarchicalPathfinder:
+    """ Hierarchical pathfinding (HPA*) for large maps. The map is cut into square
+        clusters, and the tiles on each side of the openings between two clusters
+        (entrances) form an abstract graph, with the distances between the entrances
+        of a cluster precomputed. A search only explores this small graph, and only
+        the first hop, inside the cluster of the tank, is turned into tiles.
+
+        When tiles change, only the clusters containing them and the entrances of
+        their neighbor clusters are computed again.
+    """
+
+    CLUSTER_SIZE = 10
+    MAX_ENTRANCE_WIDTH = 6 # Wider openings get an entrance at each end instead of in the middle
+
+    def __init__(self, current_map, walkable, cluster_size=CLUSTER_SIZE):
+        self.current_map  = current_map
+        self.walkable     = walkable
+        self.cluster_size = cluster_size
+        self.clusters_x   = (current_map.width + cluster_size - 1) // cluster_size
+        self.clusters_y   = (current_map.height + cluster_size - 1) // cluster_size
+        self.revision     = current_map.revision
+
+        self.borders  = {} # (cluster, neighbor cluster) -> list of (tile, tile) crossing the border
+        self.crossing = {} # entrance tile -> set of tiles across the border
+        self.edges    = {} # cluster -> {entrance tile: {entrance tile of the same cluster: distance}}
+
+        clusters = [(x, y) for y in range(self.clusters_y) for x in range(self.clusters_x)]
+        for cluster in clusters:
+            for neighbor in ((cluster[0] + 1, cluster[1]), (cluster[0], cluster[1] + 1)):
+                if neighbor[0] < self.clusters_x and neighbor[1] < self.clusters_y:
+                    self.build_border(cluster, neighbor)
+        for cluster in clusters:
+            self.build_edges(cluster)
+
+    def cluster_of(self, x, y):
+        return (x // self.cluster_size, y // self.cluster_size)
+
+    def cluster_bounds(self, cluster):
+        """ Returns the first and last (included) x and y of the tiles of a cluster. """
+        x0, y0 = cluster[0] * self.cluster_size, cluster[1] * self.cluster_size
+        return (x0, min(x0 + self.cluster_size, self.current_map.width) - 1,
+                y0, min(y0 + self.cluster_size, self.current_map.height) - 1)
+
+    def neighbor_clusters(self, cluster):
+        x, y = cluster
+        return [(nx, ny) for nx, ny in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1))
+                if 0 <= nx < self.clusters_x and 0 <= ny < self.clusters_y]
+
+    def build_border(self, cluster, neighbor):
+        """ Finds the entrances between two adjacent clusters (neighbor is to the right
+            of or below cluster) and links their tiles across the border.
+        """
+        current_map = self.current_map
+        key = (cluster, neighbor)
+        for a, b in self.borders.get(key, []):
+            self.crossing[a].discard(b)
+            self.crossing[b].discard(a)
+
+        x0, x1, y0, y1 = self.cluster_bounds(cluster)
+        if neighbor[0] > cluster[0]:
+            # Vertical border: pairs of tiles on the last column of cluster and the first of neighbor
+            pairs = [((x1, y), (x1 + 1, y)) for y in range(y0, y1 + 1)]
+        else:
+            pairs = [((x, y1), (x, y1 + 1)) for x in range(x0, x1 + 1)]
+
+        transitions = []
+        opening = []
+        for a, b in pairs + [(None, None)]:
+            if a is not None and current_map.is_walkable(*a, self.walkable) and current_map.is_walkable(*b, self.walkable):
+                opening.append((current_map.index(*a), current_map.index(*b)))
+            elif opening:
+                if len(opening) > self.MAX_ENTRANCE_WIDTH:
+                    transitions += [opening[0], opening[-1]]
+                else:
+                    transitions.append(opening[len(opening) // 2])
+                opening = []
+
+        self.borders[key] = transitions
+        for a, b in transitions:
+            self.crossing.setdefault(a, set()).add(b)
+            self.crossing.setdefault(b, set()).add(a)
+
+    def entrances(self, cluster):
+        """ Returns the set of entrance tiles inside a cluster. """
+        tiles = set()
+        for neighbor in self.neighbor_clusters(cluster):
+            key = (cluster, neighbor) if neighbor > cluster else (neighbor, cluster)
+            for a, b in self.borders.get(key, []):
+                tiles.add(a if key[0] == cluster else b)
+        return tiles
+
+    def distances_in_cluster(self, start, cluster):
+        """ Breadth first search from the tile index start, without leaving the cluster.
+            Returns the distance and the parent of each tile reached. If start is walkable,
+            the distances are also the distances from each tile to start.
+        """
+        current_map = self.current_map
+        tiles = current_map.tiles
+        x0, x1, y0, y1 = self.cluster_bounds(cluster)
+        distances = {start: 0}
+        parents = {start: START}
+        queue = deque([start])
+        while queue:
+            node = queue.popleft()
+            for offset in current_map.neighbor_offsets:
+                neighbor = node + offset
+                if neighbor not in distances and tiles[neighbor] & self.walkable:
+                    x, y = current_map.coordinates(neighbor)
+                    if x0 <= x <= x1 and y0 <= y <= y1:
+                        distances[neighbor] = distances[node] + 1
+                        parents[neighbor] = node
+                        queue.append(neighbor)
+        return distances, parents
+
+    def build_edges(self, cluster):
+        """ Computes the distances between the entrances of a cluster. """
+        entrances = self.entrances(cluster)
+        edges = {}
+        for entrance in entrances:
+            distances = self.distances_in_cluster(entrance, cluster)[0]
+            edges[entrance] = {other: distances[other] for other in entrances
+                               if other != entrance and other in distances}
+        self.edges[cluster] = edges
+
+    def update(self):
+        """ Rebuilds the clusters in which tiles changed since the last search. """
+        if self.revision == self.current_map.revision:
+            return
+        changed_tiles = self.current_map.changed_tiles(self.revision)
+        if changed_tiles is None:
+            # The changes are too old to be known, rebuild every cluster
+            changed = set((x, y) for y in range(self.clusters_y) for x in range(self.clusters_x))
+        else:
+            changed = set(self.cluster_of(x, y) for x, y in changed_tiles)
+        self.revision = self.current_map.revision
+
+        rebuilt = set()
+        for cluster in changed:
+            for neighbor in self.neighbor_clusters(cluster):
+                self.build_border(*sorted((cluster, neighbor)))
+                rebuilt.add(neighbor)
+            rebuilt.add(cluster)
+        for cluster in rebuilt:
+            self.build_edges(cluster)
+
+    def find_path(self, start, target):
+        """ Returns the tiles from start (excluded) to the first entrance on the way to target,
+            or to target if it is in the same cluster, and the number of abstract nodes expanded.
+        """
+        self.update()
+        current_map = self.current_map
+        tiles = current_map.tiles
+        if start == target:
+            return path_back_to_target(current_map, target, self.walkable)
+        if not current_map.is_walkable(*target, self.walkable):
+            return None, 0
+
+        target_cluster = self.cluster_of(*target)
+        start, target = current_map.index(*start), current_map.index(*target)
+
+        # The search leaves the start from the start itself, or from its walkable neighbors
+        # if the tank is on a tile it cannot drive through (they may be in other clusters).
+        if tiles[start] & self.walkable:
+            sources = [(start, 0)]
+        else:
+            sources = [(start + offset, 1) for offset in current_map.neighbor_offsets
+                       if tiles[start + offset] & self.walkable]
+        searches = {}
+        for source, cost in sources:
+            searches[source] = self.distances_in_cluster(source, self.cluster_of(*current_map.coordinates(source)))
+            if target in searches[source][0]:
+                return self.first_hop_path(start, source, target, searches), 0
+
+        # Distances from the entrances of the cluster of the target to the target
+        target_distances = self.distances_in_cluster(target, target_cluster)[0]
+
+        target_x, target_y = current_map.coordinates(target)
+        def heuristic(node):
+            x, y = current_map.coordinates(node)
+            return abs(x - target_x) + abs(y - target_y)
+
+        # A* on the abstract graph, the start and the target are temporary nodes. Each
+        # entry remembers the source and the first entrance it went through.
+        costs = {start: 0}
+        open_list = [(heuristic(start), 0, start, None)]
+        expanded = 0
+        while open_list:
+            estimate, negative_cost, node, first_hop = heapq.heappop(open_list)
+            cost = -negative_cost
+            if node == target:
+                return self.first_hop_path(start, first_hop[0], first_hop[1], searches), expanded
+            if cost > costs[node]:
+                continue
+            expanded += 1
+
+            if node == start:
+                successors = []
+                for source, source_cost in sources:
+                    distances = searches[source][0]
+                    for entrance in self.entrances(self.cluster_of(*current_map.coordinates(source))):
+                        if entrance in distances:
+                            successors.append((entrance, source_cost + distances[entrance], (source, entrance)))
+                    for other in self.crossing.get(source, ()):
+                        successors.append((other, source_cost + 1, (source, other)))
+            else:
+                cluster = self.cluster_of(*current_map.coordinates(node))
+                successors = [(other, distance, first_hop) for other, distance in self.edges[cluster].get(node, {}).items()]
+                successors += [(other, 1, first_hop) for other in self.crossing.get(node, ())]
+                if cluster == target_cluster and node in target_distances:
+                    successors.append((target, target_distances[node], first_hop))
+
+            for successor, distance, hop in successors:
+                new_cost = cost + distance
+                if new_cost < costs.get(successor, new_cost + 1):
+                    costs[successor] = new_cost
+                    heapq.heappush(open_list, (new_cost + heuristic(successor), -new_cost, successor, hop))
+        return None, expanded
+
+    def first_hop_path(self, start, source, hop, searches):
+        """ Returns the tiles from start (excluded) through source to hop, a tile found by the
+            search from source or right across the border from it.
+        """
+        current_map = self.current_map
+        parents = searches[source][1]
+        if hop in parents:
+            path = build_path(current_map, parents, hop)
+        else:
+            path = deque([Vec2d(current_map.coordinates(hop))])
+        if source != start:
+            path.appendleft(Vec2d(current_map.coordinates(source)))
+        return path
+
+
+# The hierarchical pathfinders of each map, shared by all the ai playing on it
+hierarchical_pathfinders = weakref.WeakKeyDictionary()
+
+def hierarchical_search(current_map, start, target, walkable):
+    """ Searches with the HierarchicalPathfinder of the map for the walkable tiles.
+        Only the tiles to the first entrance on the way are returned.
+    """
+    pathfinders = hierarchical_pathfinders.setdefault(current_map, {})
+    if walkable not in pathfinders:
+        pathfinders[walkable] = HierarchicalPathfinder(current_map, walkable)
+    return pathfinders[walkable].find_path(start, target)
+
+
+class DStarLite:
+    """ Incremental pathfinder (D* Lite) for one tank. It searches backward from the target,
+        and keeps its distances between searches: when boxes are destroyed or pushed
+        (the changes of the map), only the tiles around them and the tiles whose distance
+        depends on them are updated, instead of searching again from scratch.
+        It starts over when the target or the walkable tiles change, or when the map has
+        changed too much since the last search for its changes to be known.
+    """
+
+    def __init__(self, current_map):
+        self.current_map = current_map
+        self.target      = None
+        self.walkable    = None
+
+    def reset(self, start, target, walkable):
+        self.target     = target
+        self.walkable   = walkable
+        self.revision   = self.current_map.revision
+        self.last_start = start
+        self.km         = 0 # Increase of the heuristic since the start of the search
+        size = len(self.current_map.tiles)
+        self.g          = [INFINITY] * size # Distance to the target
+        self.rhs        = [INFINITY] * size # Distance to the target computed from the neighbors
+        self.open_keys  = {}                # Tiles to update, and their key in open_list
+        self.open_list  = []
+        self.rhs[target] = 0
+        self.push(target)
+
+    def heuristic(self, a, b):
+        ax, ay = self.current_map.coordinates(a)
+        bx, by = self.current_map.coordinates(b)
+        return abs(ax - bx) + abs(ay - by)
+
+    def key(self, node):
+        distance = min(self.g[node], self.rhs[node])
+        return (distance + self.heuristic(self.start, node) + self.km, distance)
+
+    def push(self, node):
+        key = self.key(node)
+        self.open_keys[node] = key
+        heapq.heappush(self.open_list, (key, node))
+
+    def top(self):
+        """ Returns the smallest key of the tiles to update, skipping outdated entries. """
+        while self.open_list:
+            key, node = self.open_list[0]
+            if self.open_keys.get(node) == key:
+                return key, node
+            heapq.heappop(self.open_list)
+        return (INFINITY, INFINITY), None
+
+    def update_tile(self, node):
+        tiles = self.current_map.tiles
+        if not tiles[node]:
+            return # Border around the map
+        if node != self.target:
+            self.rhs[node] = min([self.g[node + offset] + 1 for offset in self.current_map.neighbor_offsets
+                                  if tiles[node + offset] & self.walkable] + [INFINITY])
+        self.open_keys.pop(node, None)
+        if self.g[node] != self.rhs[node]:
+            self.push(node)
+
+    def compute_shortest_path(self):
+        """ Updates the tiles until the distance of the start is known. Returns the number of expanded tiles. """
+        tiles = self.current_map.tiles
+        offsets = self.current_map.neighbor_offsets
+        expanded = 0
+        while True:
+            key, node = self.top()
+            if node is None or (key >= self.key(self.start) and self.rhs[self.start] == self.g[self.start]):
+                return expanded
+            expanded += 1
+            new_key = self.key(node)
+            if key < new_key:
+                self.push(node)
+            elif self.g[node] > self.rhs[node]:
+                self.g[node] = self.rhs[node]
+                del self.open_keys[node]
+                # The distance of the tiles from which this tile can be entered may decrease
+                if tiles[node] & self.walkable:
+                    for offset in offsets:
+                        self.update_tile(node + offset)
+            else:
+                self.g[node] = INFINITY
+                self.update_tile(node)
+                for offset in offsets:
+                    self.update_tile(node + offset)
+
+    def find_path(self, start, target, walkable):
+        """ Same as the other searches of this module, but reuses the previous search. """
+        if start == target:
+            return path_back_to_target(self.current_map, target, walkable)
+        current_map = self.current_map
+        start, target = current_map.index(*start), current_map.index(*target)
+        self.start = start
+        if (target != self.target or walkable != self.walkable
+                or current_map.changed_tiles(self.revision) is None):
+            self.reset(start, target, walkable)
+        # The keys already computed are kept valid by increasing km as the start moves
+        self.km += self.heuristic(self.last_start, start)
+        self.last_start = start
+        if self.revision != current_map.revision:
+            # Repair the distances around the tiles that changed
+            for x, y in current_map.changed_tiles(self.revision):
+                node = current_map.index(x, y)
+                self.update_tile(node)
+                for offset in current_map.neighbor_offsets:
+                    self.update_tile(node + offset)
+            self.revision = current_map.revision
+
+        expanded = self.compute_shortest_path()
+        if self.g[start] == INFINITY and self.rhs[start] == INFINITY:
+            return None, expanded
+
+        # Follow the neighbors with the shortest distance to the target
+        tiles = current_map.tiles
+        path = deque()
+        node = start
+        while node != target and len(path) < len(tiles):
+            node = min((node + offset for offset in current_map.neighbor_offsets if tiles[node + offset] & walkable),
+                       key=lambda neighbor: self.g[neighbor])
+            path.append(Vec2d(current_map.coordinates(node)))
+        return path, expanded
+
+
+PATHFINDERS = {
+    "bfs": breadth_first_search,
+    "astar": a_star,
+    "jps": jump_point_search,
+    "hpa": hierarchical_search,
+}
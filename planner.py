@@ -0,0 +1,98 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+from pymunk import Vec2d
+import pathfinding
+
+
+class GridSnapshot:
+    """ A read-only copy of the tiles of a maps.Map, with what the searches of pathfinding
+        need from a map. It does not import the ctf modules (which load images), so it
+        can be sent to worker processes.
+    """
+
+    def __init__(self, current_map):
+        self.width            = current_map.width
+        self.height           = current_map.height
+        self.revision         = current_map.revision
+        self.stride           = current_map.stride
+        self.tiles            = bytes(current_map.tiles)
+        self.neighbor_offsets = current_map.neighbor_offsets
+
+    def index(self, x, y):
+        return (y + 1) * self.stride + x + 1
+
+    def coordinates(self, index):
+        y, x = divmod(index, self.stride)
+        return x - 1, y - 1
+
+    def is_walkable(self, x, y, mask):
+        return 0 <= x < self.width and 0 <= y < self.height and self.tiles[self.index(x, y)] & mask != 0
+
+    def changed_tiles(self, revision):
+        return set() # A snapshot never changes
+
+
+def plan(snapshot, pathfinder, start, target, walkable, tile_costs, extra_costs):
+    """ Runs in a worker: searches a path on a snapshot, and returns its tiles as tuples. """
+    if pathfinder == "weighted":
+        path, expanded = pathfinding.weighted_search(snapshot, start, target, walkable, tile_costs, extra_costs)
+    else:
+        path, expanded = pathfinding.PATHFINDERS[pathfinder](snapshot, start, target, walkable)
+    return (None if path is None else [tuple(tile) for tile in path]), expanded
+
+
+#-- Pathfinders that can run in the workers, the others keep state between searches
+ASYNC_PATHFINDERS = ("bfs", "astar", "jps", "weighted")
+
+
+class Planner:
+    """ Searches the paths of the ai of a game in a pool of worker threads (or processes),
+        on snapshots of the map, while the main loop carries on with the physics and the
+        display. The paths requested during a tick are collected at the start of the next
+        one, so the ai get them on the next tick whatever the speed of the workers.
+
+        pathfinder is one of the searches in pathfinding.PATHFINDERS that keep nothing
+        between calls (ASYNC_PATHFINDERS), or "weighted" with the cost of each kind of
+        tile in tile_costs (see pathfinding.weighted_search).
+    """
+
+    PENDING = object() # Returned by request while the path is being searched
+
+    def __init__(self, current_map, pathfinder, tile_costs=None, workers=None, processes=False):
+        self.current_map = current_map
+        self.pathfinder  = pathfinder
+        self.tile_costs  = tile_costs
+        self.executor    = (ProcessPoolExecutor if processes else ThreadPoolExecutor)(max_workers=workers)
+        self.snapshot    = None
+        self.requested   = {} # The searches requested since the last collect, and their future
+        self.finished    = {} # The paths found by the searches requested during the last tick
+        self.searches    = 0
+
+    def request(self, start, target, walkable, extra_costs=None):
+        """ Returns the path (a deque of Vec2d, or None if there is none) from start to
+            target on the current revision of the map, if it has been found. Otherwise
+            starts the search if needed and returns PENDING. extra_costs is the cost layer
+            of the weighted search, if any.
+        """
+        key = (self.current_map.revision, start, target, walkable)
+        if key in self.finished:
+            path, expanded = self.finished[key]
+            return (None if path is None else deque(Vec2d(tile) for tile in path)), expanded
+        if key not in self.requested:
+            if self.snapshot is None or self.snapshot.revision != self.current_map.revision:
+                self.snapshot = GridSnapshot(self.current_map)
+            self.requested[key] = self.executor.submit(plan, self.snapshot, self.pathfinder, start, target,
+                                                       walkable, self.tile_costs, extra_costs)
+            self.searches += 1
+        return Planner.PENDING
+
+    def collect(self):
+        """ Waits for the searches requested during the last tick, called once per tick. """
+        wait(self.requested.values())
+        revision = self.current_map.revision
+        # The paths of older revisions of the map will not be asked for again
+        self.finished = {key: future.result() for key, future in self.requested.items() if key[0] == revision}
+        self.requested = {}
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
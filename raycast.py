@@ -0,0 +1,128 @@
+import math
+from collections import namedtuple
+import maps
+
+#-- Kinds of tiles that stop a ray
+BLOCKING = maps.ROCK | maps.WOOD | maps.METAL
+
+#   What a ray hit first: the distance from the start of the ray, the tile, the kind of
+#   the tile if it is a box (0 otherwise) and the object of the overlay if it is one.
+RayHit = namedtuple("RayHit", ["distance", "tile", "kind", "obj"])
+
+
+def tiles_on_ray(start, end):
+    """ Walks the tiles crossed by the segment from start to end, in order (Amanatides
+        and Woo grid traversal). Yields the coordinates of each tile and the fractions
+        of the segment (between 0 and 1) where the ray enters and leaves it.
+    """
+    x0, y0 = start
+    x1, y1 = end
+    x, y = math.floor(x0), math.floor(y0)
+    dx, dy = x1 - x0, y1 - y0
+    step_x = 1 if dx > 0 else -1
+    step_y = 1 if dy > 0 else -1
+    # Fraction of the segment needed to cross a whole tile, and to reach the next column or row
+    delta_x = abs(1 / dx) if dx else math.inf
+    delta_y = abs(1 / dy) if dy else math.inf
+    next_x = ((x + 1 - x0) if dx > 0 else (x0 - x)) * delta_x if dx else math.inf
+    next_y = ((y + 1 - y0) if dy > 0 else (y0 - y)) * delta_y if dy else math.inf
+
+    enter = 0
+    while True:
+        leave = min(next_x, next_y, 1)
+        yield x, y, enter, leave
+        if leave >= 1:
+            return
+        if next_x < next_y:
+            x += step_x
+            enter = next_x
+            next_x += delta_x
+        else:
+            y += step_y
+            enter = next_y
+            next_y += delta_y
+
+
+def hit_circle(start, direction, center, radius):
+    """ Returns the fraction of direction (from start) where the ray enters the circle,
+        0 if start is inside it, or None if the ray misses it.
+    """
+    fx, fy = start[0] - center[0], start[1] - center[1]
+    a = direction[0] * direction[0] + direction[1] * direction[1]
+    b = fx * direction[0] + fy * direction[1]
+    c = fx * fx + fy * fy - radius * radius
+    if c <= 0:
+        return 0
+    discriminant = b * b - a * c
+    if a == 0 or discriminant < 0 or b > 0:
+        return None
+    return (-b - math.sqrt(discriminant)) / a
+
+
+class Raycaster:
+    """ Casts rays over the tiles of a map instead of the physics engine: the boxes are
+        read from the tiles of the map, and the tanks and bullets from an overlay of
+        circles that is filled by update (once per tick). Used by the ai for their
+        line of fire and by the display for the fog of war.
+    """
+
+    def __init__(self, current_map, blocking=BLOCKING):
+        self.current_map = current_map
+        self.blocking    = blocking
+        self.overlay     = {} # The objects overlapping each tile
+
+    def update(self, objects):
+        """ Puts the objects (tanks and bullets) in the overlay, as circles as large as
+            the smallest side of their shape.
+        """
+        self.overlay.clear()
+        for obj in objects:
+            x, y = obj.body.position
+            radius = min(abs(obj.points[2][0]), abs(obj.points[2][1]))
+            for tile_x in range(math.floor(x - radius), math.floor(x + radius) + 1):
+                for tile_y in range(math.floor(y - radius), math.floor(y + radius) + 1):
+                    self.overlay.setdefault((tile_x, tile_y), []).append((obj, (x, y), radius))
+
+    def cast(self, start, end, ignore=None, objects=True):
+        """ Returns the RayHit of the first box, or object of the overlay (except ignore),
+            on the segment from start to end, or None if there is none before end or the
+            edge of the map.
+        """
+        current_map = self.current_map
+        tiles = current_map.tiles
+        direction = (end[0] - start[0], end[1] - start[1])
+        length = math.hypot(*direction)
+        for x, y, enter, leave in tiles_on_ray(start, end):
+            if not (0 <= x < current_map.width and 0 <= y < current_map.height):
+                return None
+            nearest = None
+            kind = tiles[current_map.index(x, y)]
+            if kind & self.blocking:
+                nearest = RayHit(enter * length, (x, y), kind, None)
+                leave = enter # Only the objects in front of the box can be hit first
+            if objects:
+                for obj, center, radius in self.overlay.get((x, y), ()):
+                    if obj is ignore:
+                        continue
+                    fraction = hit_circle(start, direction, center, radius)
+                    if fraction is not None and fraction <= leave and (nearest is None or fraction * length < nearest.distance):
+                        nearest = RayHit(fraction * length, (x, y), 0, obj)
+            if nearest is not None:
+                return nearest
+        return None
+
+    def visible_tiles(self, position, radius):
+        """ Returns the set of tiles whose center is within radius of position and can be
+            seen from there: the boxes hide the tiles behind them, but are visible.
+        """
+        x, y = position
+        visible = set()
+        for tile_x in range(max(math.floor(x - radius), 0), min(math.floor(x + radius), self.current_map.width - 1) + 1):
+            for tile_y in range(max(math.floor(y - radius), 0), min(math.floor(y + radius), self.current_map.height - 1) + 1):
+                center = (tile_x + 0.5, tile_y + 0.5)
+                if math.hypot(center[0] - x, center[1] - y) > radius:
+                    continue
+                hit = self.cast(position, center, objects=False)
+                if hit is None or hit.tile == (tile_x, tile_y):
+                    visible.add((tile_x, tile_y))
+        return visible
@@ -0,0 +1,112 @@
+import pygame
+
+
+class DirtyRenderer:
+    """ Draws the game objects by only repainting the parts of the screen that changed
+        since the last frame (dirty rectangles), instead of redrawing the whole
+        background and calling pygame.display.flip() every tick.
+
+        For every object the renderer remembers the rectangle it was drawn in. When an
+        object moves, turns or disappears, its previous and current rectangles are
+        restored from the background, the objects overlapping them are redrawn, and
+        only those rectangles are sent to the display.
+    """
+
+    def __init__(self, screen, background):
+        self.screen      = screen
+        self.background  = background
+        self.drawn       = {}   # Maps each object to the (sprite, rect) it was last drawn with
+        self.invalid     = []   # Rectangles that must be repainted on the next frame
+        self.full_redraw = True
+
+    def invalidate(self, rect=None):
+        """ Forces a rectangle of the screen to be repainted on the next frame,
+            or the whole screen if no rectangle is given.
+        """
+        if rect is None:
+            self.full_redraw = True
+        else:
+            self.invalid.append(pygame.Rect(rect))
+
+    def draw(self, game_objects):
+        """ Draws the game objects and updates the display. Returns the list of
+            rectangles that were updated.
+        """
+        current = {}
+        dirty = self.invalid
+        self.invalid = []
+
+        for obj in game_objects:
+            sprite, rect = obj.screen_sprite()
+            current[obj] = (sprite, rect)
+            previous = self.drawn.pop(obj, None)
+            if previous is None:
+                dirty.append(rect)
+            elif previous[0] is not sprite or previous[1] != rect:
+                dirty.append(previous[1])
+                dirty.append(rect)
+
+        # Objects that are no longer in the list leave their last rectangle behind
+        for sprite, rect in self.drawn.values():
+            dirty.append(rect)
+        self.drawn = current
+
+        if self.full_redraw:
+            self.full_redraw = False
+            self.screen.blit(self.background, (0, 0))
+            for sprite, rect in current.values():
+                self.screen.blit(sprite, rect)
+            pygame.display.flip()
+            return [self.screen.get_rect()]
+
+        if not dirty:
+            return dirty
+
+        # Repaint each dirty rectangle on its own, clipped so that redrawing an object
+        # that only partly overlaps it does not cover the objects drawn after it.
+        sprites = [sprite for sprite, rect in current.values()]
+        rects   = [rect for sprite, rect in current.values()]
+        for dirty_rect in dirty:
+            self.screen.set_clip(dirty_rect)
+            self.screen.blit(self.background, dirty_rect, dirty_rect)
+            for i in dirty_rect.collidelistall(rects):
+                self.screen.blit(sprites[i], rects[i])
+        self.screen.set_clip(None)
+
+        pygame.display.update(dirty)
+        return dirty
+
+
+class StaticLayer:
+    """ The background of the level with the objects that never move (such as rock
+        boxes) drawn into it once, so that they do not need to be updated and drawn
+        every frame. If a static object is removed, only the tiles it covered are
+        rebuilt.
+    """
+
+    def __init__(self, base):
+        """ Takes as argument the background without any object on it (the grass). """
+        self.base    = base
+        self.surface = base.copy()
+        self.objects = {}   # Maps each static object to the (sprite, rect) it was drawn with
+
+    def add(self, obj):
+        """ Draws a static object into the layer. """
+        sprite, rect = obj.screen_sprite()
+        self.objects[obj] = (sprite, rect)
+        self.surface.blit(sprite, rect)
+
+    def remove(self, obj):
+        """ Removes a static object from the layer and returns the rectangle that was rebuilt. """
+        sprite, rect = self.objects.pop(obj)
+        self.rebuild(rect)
+        return rect
+
+    def rebuild(self, rect):
+        """ Redraws the base and the static objects inside a rectangle of the layer. """
+        self.surface.set_clip(rect)
+        self.surface.blit(self.base, rect, rect)
+        for sprite, obj_rect in self.objects.values():
+            if obj_rect.colliderect(rect):
+                self.surface.blit(sprite, obj_rect)
+        self.surface.set_clip(None)
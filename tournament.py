@@ -0,0 +1,108 @@
+import pygame
+import argparse
+import os
+import random
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+#-- Initialise a dummy display, the images of the ctf modules need one to be loaded.
+#   This is also run by every worker process that imports this module.
+os.environ["SDL_VIDEODRIVER"] = "dummy"
+pygame.display.init()
+pygame.display.set_mode()
+
+import maps
+import pathfinding
+from game import Game
+
+
+#-- How much the start of the tanks is moved in a match with a seed
+START_JITTER       = 0.2 # Distance in tiles, the tanks stay on their start tile
+START_ANGLE_JITTER = 20  # Angle in degrees
+
+
+def jittered_map(current_map, seed):
+    """ Returns a copy of the map where the tanks start at a position and angle moved a
+        little at random (the same seed always gives the same copy). A match has no
+        randomness, so this is what makes two matches on the same map play differently.
+    """
+    rng = random.Random(seed)
+    start_positions = [[x + rng.uniform(-START_JITTER, START_JITTER), y + rng.uniform(-START_JITTER, START_JITTER),
+                        angle + rng.uniform(-START_ANGLE_JITTER, START_ANGLE_JITTER)]
+                       for x, y, angle in current_map.start_positions]
+    return maps.Map(current_map.width, current_map.height, current_map.boxes, start_positions,
+                    current_map.flag_position)
+
+
+def run_match(map_name, max_ticks, pathfinder="flow", seed=None):
+    """ Plays one headless match where every tank is controlled by the ai, using
+        the given pathfinder (see Game). With a seed, the tanks start from a slightly
+        different position and angle (see jittered_map), otherwise from those of the map.
+        Returns a dictionary with the map, the seed, the index of the winning tank (None
+        if nobody won within max_ticks), the number of ticks and the wall time.
+    """
+    start_time = time.perf_counter()
+    current_map = getattr(maps, map_name)
+    if seed is not None:
+        current_map = jittered_map(current_map, seed)
+    game = Game(current_map, pathfinder=pathfinder)
+    winner = game.step(max_ticks)
+    return {"map": map_name, "seed": seed, "winner": winner, "ticks": game.ticks,
+            "wall_time": time.perf_counter() - start_time}
+
+
+def run_tournament(map_names, matches, max_ticks, workers=None, pathfinder="flow"):
+    """ Plays the given number of matches on each map, one match per worker process.
+        The matches on a map are played with the seeds 0 to matches - 1, so that they
+        differ, and a tournament is played the same every time.
+        Returns the list of match results and the total wall time.
+    """
+    start_time = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run_match, map_name, max_ticks, pathfinder, seed)
+                   for map_name in map_names for seed in range(matches)]
+        results = [future.result() for future in futures]
+    return results, time.perf_counter() - start_time
+
+
+def summary(results, wall_time):
+    """ Returns a printable summary of the results of a tournament. """
+    lines = []
+    for map_name in sorted(set(result["map"] for result in results)):
+        map_results = [result for result in results if result["map"] == map_name]
+        wins = Counter(result["winner"] for result in map_results if result["winner"] is not None)
+        captures = [result["ticks"] for result in map_results if result["winner"] is not None]
+        times = [result["wall_time"] for result in map_results]
+
+        lines.append("%s: %d matches" % (map_name, len(map_results)))
+        lines.append("  wins per tank:     %s" % ", ".join("%d: %d" % win for win in sorted(wins.items())))
+        lines.append("  no winner:         %d" % (len(map_results) - len(captures)))
+        if captures:
+            lines.append("  ticks to capture:  min %d, mean %.0f, max %d"
+                         % (min(captures), sum(captures) / len(captures), max(captures)))
+        lines.append("  wall time (s):     min %.3f, mean %.3f, max %.3f"
+                     % (min(times), sum(times) / len(times), max(times)))
+
+    match_time = sum(result["wall_time"] for result in results)
+    lines.append("%d matches in %.2f s, %.2f s of match time (%.1fx speedup)"
+                 % (len(results), wall_time, match_time, match_time / wall_time))
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plays headless ai against ai matches in parallel")
+    parser.add_argument("--maps", nargs="+", default=["map0", "map1", "map2"],
+                        help="names of the maps in maps.py to play on")
+    parser.add_argument("--matches", type=int, default=4,
+                        help="number of matches on each map, each with its own start jitter")
+    parser.add_argument("--max-ticks", type=int, default=20000,
+                        help="a match nobody has won after this many ticks is a draw")
+    parser.add_argument("--pathfinder", default="flow", choices=["flow", "dstar", "weighted"] + list(pathfinding.PATHFINDERS),
+                        help="how the ai find their way")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of worker processes (default: number of cores)")
+    args = parser.parse_args()
+
+    results, wall_time = run_tournament(args.maps, args.matches, args.max_ticks, args.workers, args.pathfinder)
+    print(summary(results, wall_time))
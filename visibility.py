@@ -0,0 +1,60 @@
+import numpy
+
+
+class Visibility:
+    """ Which tanks can see each other, computed once per tick for all the ai.
+        distances[i, j] is the distance between the tanks i and j, and visible[i, j]
+        whether nothing but tanks and bullets is between them and they are at most
+        max_distance apart. The distances are computed for all the pairs at once, the
+        line of sight only for the pairs that are close enough, with a raycast.Raycaster.
+        The game calls expire every tick, and the matrices are computed again the first
+        time they are needed after that (through can_see, visible_tanks or update).
+    """
+
+    SIGHT_RANGE = 8 # Distance (in tiles) up to which the tanks see each other, by default
+
+    def __init__(self, raycaster, tanks_list, max_distance=SIGHT_RANGE):
+        """ max_distance is how far the tanks see (in tiles). """
+        self.raycaster    = raycaster
+        self.tanks_list   = tanks_list
+        self.max_distance = max_distance
+        self.index        = {}
+        self.distances    = numpy.zeros((0, 0))
+        self.visible      = numpy.zeros((0, 0), dtype=bool)
+        self.raycasts     = 0 # Number of line of sight raycasts made by the last update
+        self.outdated     = True
+
+    def expire(self):
+        """ The tanks have moved, called once per tick. """
+        self.outdated = True
+
+    def update(self):
+        """ Computes the matrices, if the tanks have moved since the last time. """
+        if not self.outdated:
+            return
+        self.outdated = False
+        tanks = self.tanks_list
+        self.index = {tank: i for i, tank in enumerate(tanks)}
+        positions = numpy.array([tuple(tank.body.position) for tank in tanks], dtype=float).reshape(-1, 2)
+        offsets = positions[:, numpy.newaxis, :] - positions[numpy.newaxis, :, :]
+        self.distances = numpy.hypot(offsets[..., 0], offsets[..., 1])
+
+        # Each pair once, the matrix is symmetric
+        candidates = numpy.triu(self.distances <= self.max_distance, k=1)
+        self.visible = numpy.zeros(self.distances.shape, dtype=bool)
+        firsts, seconds = numpy.nonzero(candidates)
+        for i, j in zip(firsts.tolist(), seconds.tolist()):
+            if self.raycaster.cast(positions[i], positions[j], objects=False) is None:
+                self.visible[i, j] = self.visible[j, i] = True
+        self.raycasts = len(firsts)
+
+    def can_see(self, tank, other_tank):
+        self.update()
+        return bool(self.visible[self.index[tank], self.index[other_tank]])
+
+    def visible_tanks(self, tank):
+        """ Returns the tanks that tank can see, the closest first. """
+        self.update()
+        i = self.index[tank]
+        seen = numpy.nonzero(self.visible[i])[0]
+        return [self.tanks_list[j] for j in seen[numpy.argsort(self.distances[i, seen], kind="stable")].tolist()]